@@ -4,53 +4,227 @@ Each function handles a specific type of question about churn data.
 """
 import streamlit as st
 import pandas as pd
+import numpy as np
+from functools import wraps
 from typing import Optional, Dict
 import plotly.express as px
 import plotly.graph_objects as go
 
+# Risk bucket edges: low < 0.25 <= medium <= 0.75 < high
+RISK_BUCKET_EDGES = np.array([0.25, np.nextafter(0.75, 1.0)])
+
+# Cap on rows sent to st.dataframe for customer lists
+MAX_DISPLAY_ROWS = 500
+
+# Columns worth showing in customer tables; everything else stays server-side
+DISPLAY_COLUMNS = ('customer_id', 'churn_probability', 'churn_prediction', 'plan_tier', 'is_trial')
+
+# Common churn features explanation with importance scores
+_FEATURES_DATA = {
+    "Feature": [
+        "Subscription Duration",
+        "Plan Tier",
+        "MRR/ARR Amount",
+        "Auto Renew Status",
+        "Trial Status",
+        "Recent Downgrades",
+        "Number of Seats",
+        "Billing Frequency",
+        "Upgrade Activity",
+        "Customer Age"
+    ],
+    "Importance": [95, 88, 85, 92, 78, 82, 65, 58, 52, 48],
+    "Impact": [
+        "Higher churn for newer customers",
+        "Basic plan customers churn more",
+        "Lower value = higher churn risk",
+        "Disabled auto-renew = strong churn signal",
+        "Trial customers more likely to churn",
+        "Downgrade activity signals dissatisfaction",
+        "Single-seat customers churn easily",
+        "Monthly billing shows less commitment",
+        "Lack of upgrades indicates low engagement",
+        "Newer accounts have higher risk"
+    ]
+}
+_FEATURES_DF = pd.DataFrame(_FEATURES_DATA)
+_FEATURES_DF_SORTED = _FEATURES_DF.sort_values('Importance', ascending=True)
+
+
+@st.cache_data(show_spinner=False)
+def _features_figure():
+    """Build the static feature importance chart once per process."""
+    fig = px.bar(
+        _FEATURES_DF_SORTED,
+        y='Feature',
+        x='Importance',
+        orientation='h',
+        title='Feature Importance for Churn Prediction',
+        labels={'Importance': 'Importance Score (0-100)', 'Feature': 'Feature Name'},
+        color='Importance',
+        color_continuous_scale='RdYlGn'
+    )
+    fig.update_layout(height=500)
+    return fig
+
+
+@st.cache_data(show_spinner=False)
+def _styled_features_html() -> str:
+    """Render the gradient-styled feature table to HTML once per process."""
+    return _FEATURES_DF.style.background_gradient(subset=['Importance'], cmap='RdYlGn').to_html()
+
+@st.cache_data(show_spinner=False)
+def _sort_probabilities(probs: np.ndarray):
+    """
+    Argsort the finite probabilities; cached so reruns over the same data skip the sort.
+
+    Missing (NaN) probabilities are left out, as pandas comparisons and reductions skip them.
+    """
+    sorted_idx = np.flatnonzero(np.isfinite(probs))
+    sorted_idx = sorted_idx[probs[sorted_idx].argsort(kind='stable')]
+    return sorted_idx, probs[sorted_idx]
+
+
+@st.cache_data(show_spinner=False)
+def _histogram_figure(values: np.ndarray, title: str, nbins: int = 50) -> go.Figure:
+    """Bin probabilities server-side so only bin counts are sent to the browser (missing values are skipped)."""
+    counts, edges = np.histogram(values[np.isfinite(values)], bins=nbins)
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts,
+                           width=np.diff(edges)))
+    fig.update_layout(title=title, bargap=0,
+                      xaxis_title='Churn Probability', yaxis_title='Number of Customers')
+    return fig
+
+def _plan_box_figure(predictions_df: pd.DataFrame) -> go.Figure:
+    """Box plot of churn probability per plan tier from server-side quartiles."""
+    quartiles = (predictions_df.groupby('plan_tier', observed=True)['churn_probability']
+                 .quantile([0, 0.25, 0.5, 0.75, 1]).unstack())
+    fig = go.Figure(go.Box(
+        x=quartiles.index.astype(str),
+        lowerfence=quartiles[0], q1=quartiles[0.25], median=quartiles[0.5],
+        q3=quartiles[0.75], upperfence=quartiles[1],
+    ))
+    fig.update_layout(title='Churn Probability by Plan Tier',
+                      xaxis_title='Plan Tier', yaxis_title='Churn Probability')
+    return fig
+
+@st.fragment
+def _chart_toggle(label: str, key: str, build_figure) -> None:
+    """
+    Build and send a chart only once the user switches it on.
+
+    Runs as a fragment, so the toggle reruns just this chart; the handler output
+    around it (shown from a one-shot button press) stays on screen.
+    """
+    if st.toggle(label, key=key):
+        st.plotly_chart(build_figure(), use_container_width=True)
+
+def _group_stats(codes: np.ndarray, values: np.ndarray, n_groups: int):
+    """
+    Mean/min/max of the finite values per integer group code in one sorted pass.
+
+    Missing values are skipped, as in a pandas groupby; a group with none left gets NaN.
+    """
+    finite = np.isfinite(values)
+    codes, values = codes[finite], values[finite]
+    values = values[np.argsort(codes, kind='stable')]
+    counts = np.bincount(codes, minlength=n_groups)
+    means, mins, maxs = (np.full(n_groups, np.nan) for _ in range(3))
+    present = counts > 0
+    if present.any():
+        # Segment starts of the non-empty groups; empty groups add no rows in between
+        starts = (np.cumsum(counts) - counts)[present]
+        means[present] = np.add.reduceat(values, starts, dtype=np.float64) / counts[present]
+        mins[present] = np.minimum.reduceat(values, starts)
+        maxs[present] = np.maximum.reduceat(values, starts)
+    return means, mins, maxs
+
+def _requires_predictions(handler):
+    """Warn and skip the handler when there is no prediction data to analyze."""
+    @wraps(handler)
+    def wrapper(self, entities: Dict) -> None:
+        if self.predictions_df is None or self.predictions_df.empty:
+            st.warning("No prediction data available. Please make predictions first.")
+            return
+        return handler(self, entities)
+    return wrapper
+
 class AnalyticsHandlers:
     """Handlers for different analytics intents."""
     
     def __init__(self, predictions_df: Optional[pd.DataFrame] = None):
+        # Categorical plan tiers let grouping work on integer codes instead of hashing strings
+        if predictions_df is not None and 'plan_tier' in predictions_df.columns:
+            predictions_df = predictions_df.assign(
+                plan_tier=predictions_df['plan_tier'].astype('category')
+            )
         self.predictions_df = predictions_df
         
+        # Contiguous float64 copy of the probabilities, sorted once so threshold queries
+        # are a binary search + slice; float32 would move values across the bucket edges
+        # and user thresholds (0.75000001 rounds to 0.75)
+        self._probs = None
+        self._sorted_idx = None
+        self._sorted_probs = None
+        if predictions_df is not None and 'churn_probability' in predictions_df.columns:
+            self._probs = predictions_df['churn_probability'].to_numpy(dtype=np.float64)
+            self._sorted_idx, self._sorted_probs = _sort_probabilities(self._probs)
+        
+        # Boolean masks for low-cardinality filters, built once per instance
+        self._trial_mask = None
+        if predictions_df is not None and 'is_trial' in predictions_df.columns:
+            # Nullable/Arrow columns compare to NA for missing values; treat those as not on trial
+            self._trial_mask = predictions_df['is_trial'].eq(1).fillna(False).to_numpy(dtype=bool)
+    
+    @staticmethod
+    def _threshold(entities: Dict, default: float) -> float:
+        """Read a probability threshold from entities, accepting 0-1 or percentages."""
+        numbers = entities.get('numbers')
+        if not numbers:
+            return default
+        value = numbers[0]
+        return value / 100 if value > 1 else value
+        
+    def _risk_partition(self):
+        """Return (low, medium/high) split positions in the sorted probabilities."""
+        low_split, high_split = np.searchsorted(self._sorted_probs, RISK_BUCKET_EDGES).tolist()
+        return low_split, high_split
+    
+    @staticmethod
+    def _display_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """Project a customer table down to the columns shown in the UI."""
+        return df[[c for c in DISPLAY_COLUMNS if c in df.columns]]
+    
+    @_requires_predictions
     def show_high_risk_customers(self, entities: Dict) -> None:
         """Show customers with high churn probability."""
-        if self.predictions_df is None or self.predictions_df.empty:
-            st.warning("No prediction data available. Please make predictions first.")
-            return
+        threshold = self._threshold(entities, 0.75)
         
-        threshold = 0.75
-        if 'numbers' in entities and entities['numbers']:
-            threshold = entities['numbers'][0] / 100 if entities['numbers'][0] > 1 else entities['numbers'][0]
-        
-        high_risk = self.predictions_df[self.predictions_df['churn_probability'] > threshold]
+        split = np.searchsorted(self._sorted_probs, threshold, side='right')
+        high_idx = self._sorted_idx[split:]
         
         st.write(f"### High-Risk Customers (>{threshold:.0%} churn probability)")
-        st.write(f"Found **{len(high_risk)}** high-risk customers out of {len(self.predictions_df)} total")
+        st.write(f"Found **{len(high_idx)}** high-risk customers out of {len(self.predictions_df)} total")
         
-        if not high_risk.empty:
-            st.dataframe(high_risk.sort_values('churn_probability', ascending=False))
+        if len(high_idx) > 0:
+            # Index is ascending, so the riskiest rows are the tail
+            st.dataframe(self._display_frame(self.predictions_df.iloc[high_idx[-MAX_DISPLAY_ROWS:][::-1]]))
+            if len(high_idx) > MAX_DISPLAY_ROWS:
+                st.caption(f"Showing the top {MAX_DISPLAY_ROWS} customers by churn probability")
             
-            # Visualization
-            fig = px.histogram(high_risk, x='churn_probability', 
-                             title='Distribution of High-Risk Customers',
-                             labels={'churn_probability': 'Churn Probability'})
-            st.plotly_chart(fig, use_container_width=True)
+            # Visualization, built only when requested
+            _chart_toggle("📊 Show chart", "chart_high_risk", lambda: _histogram_figure(
+                self._sorted_probs[split:], title='Distribution of High-Risk Customers'))
         else:
             st.success("No high-risk customers found!")
     
+    @_requires_predictions
     def show_low_risk_customers(self, entities: Dict) -> None:
         """Show customers with low churn probability."""
-        if self.predictions_df is None or self.predictions_df.empty:
-            st.warning("No prediction data available.")
-            return
+        threshold = self._threshold(entities, 0.25)
         
-        threshold = 0.25
-        if 'numbers' in entities and entities['numbers']:
-            threshold = entities['numbers'][0] / 100 if entities['numbers'][0] > 1 else entities['numbers'][0]
-        
-        low_risk = self.predictions_df[self.predictions_df['churn_probability'] < threshold]
+        split = np.searchsorted(self._sorted_probs, threshold, side='left')
+        low_risk = self.predictions_df.iloc[self._sorted_idx[:split]]
         
         st.write(f"### Low-Risk Customers (<{threshold:.0%} churn probability)")
         st.write(f"Found **{len(low_risk)}** low-risk customers")
@@ -58,67 +232,66 @@ class AnalyticsHandlers:
         if not low_risk.empty:
             st.dataframe(low_risk.head(50))
     
+    @_requires_predictions
     def show_latest_predictions(self, entities: Dict) -> None:
         """Show most recent predictions."""
-        if self.predictions_df is None or self.predictions_df.empty:
-            st.warning("No prediction data available.")
-            return
-        
         limit = 20
         if 'numbers' in entities and entities['numbers']:
             limit = int(entities['numbers'][0])
         
         st.write(f"### Latest {limit} Predictions")
-        st.dataframe(self.predictions_df.tail(limit))
+        st.dataframe(self._display_frame(self.predictions_df.tail(limit)))
     
+    @_requires_predictions
     def show_churn_statistics(self, entities: Dict) -> None:
         """Show comprehensive churn statistics."""
-        if self.predictions_df is None or self.predictions_df.empty:
-            st.warning("No prediction data available.")
-            return
-        
         st.write("### Churn Statistics")
         
         col1, col2, col3, col4 = st.columns(4)
         
+        # Bucket sizes fall out of the cached sort with two binary searches;
+        # rows without a probability are counted in the total but in no bucket
+        total = len(self.predictions_df)
+        low_split, high_split = self._risk_partition()
+        low_risk = low_split
+        medium_risk = high_split - low_split
+        high_risk = len(self._sorted_probs) - high_split
+        
         with col1:
-            total = len(self.predictions_df)
             st.metric("Total Customers", total)
         
         with col2:
-            high_risk = len(self.predictions_df[self.predictions_df['churn_probability'] > 0.75])
             st.metric("High Risk", high_risk, f"{high_risk/total*100:.1f}%")
         
         with col3:
-            medium_risk = len(self.predictions_df[
-                (self.predictions_df['churn_probability'] >= 0.25) & 
-                (self.predictions_df['churn_probability'] <= 0.75)
-            ])
             st.metric("Medium Risk", medium_risk, f"{medium_risk/total*100:.1f}%")
         
         with col4:
-            low_risk = len(self.predictions_df[self.predictions_df['churn_probability'] < 0.25])
             st.metric("Low Risk", low_risk, f"{low_risk/total*100:.1f}%")
         
-        # Distribution chart
-        st.write("#### Churn Probability Distribution")
-        fig = px.histogram(self.predictions_df, x='churn_probability', 
-                          nbins=50,
-                          title='Customer Churn Probability Distribution',
-                          labels={'churn_probability': 'Churn Probability', 'count': 'Number of Customers'})
-        st.plotly_chart(fig, use_container_width=True)
+        # Distribution chart, built only when requested
+        _chart_toggle("📊 Churn Probability Distribution", "chart_churn_distribution", lambda: _histogram_figure(
+            self._probs, title='Customer Churn Probability Distribution'))
     
+    @_requires_predictions
     def show_average_churn(self, entities: Dict) -> None:
         """Calculate and display average churn metrics."""
-        if self.predictions_df is None or self.predictions_df.empty:
-            st.warning("No prediction data available.")
-            return
-        
         st.write("### Average Churn Metrics")
         
-        avg_prob = self.predictions_df['churn_probability'].mean()
-        median_prob = self.predictions_df['churn_probability'].median()
-        std_prob = self.predictions_df['churn_probability'].std()
+        # Reuse the mean for the deviation instead of letting std() recompute it;
+        # the sorted copy holds only the finite probabilities, like pandas' skipna
+        probs = self._sorted_probs
+        n = probs.shape[0]
+        if n == 0:
+            # No finite probability at all; pandas shows NaN for every metric
+            avg_prob = median_prob = std_prob = float('nan')
+        else:
+            avg_prob = probs.mean(dtype=np.float64)
+            # The sorted copy is already cached, so the median is an index lookup
+            mid = n // 2
+            median_prob = probs[mid] if n % 2 else (float(probs[mid - 1]) + float(probs[mid])) / 2
+            deviations = probs - avg_prob
+            std_prob = np.sqrt(deviations @ deviations / (n - 1)) if n > 1 else float('nan')
         
         col1, col2, col3 = st.columns(3)
         
@@ -139,110 +312,65 @@ class AnalyticsHandlers:
         else:
             st.info("💡 General feature importance for churn prediction (train a model for specific insights)")
         
-        # Common churn features explanation with importance scores
-        features_data = {
-            "Feature": [
-                "Subscription Duration",
-                "Plan Tier",
-                "MRR/ARR Amount",
-                "Auto Renew Status",
-                "Trial Status",
-                "Recent Downgrades",
-                "Number of Seats",
-                "Billing Frequency",
-                "Upgrade Activity",
-                "Customer Age"
-            ],
-            "Importance": [95, 88, 85, 92, 78, 82, 65, 58, 52, 48],
-            "Impact": [
-                "Higher churn for newer customers",
-                "Basic plan customers churn more",
-                "Lower value = higher churn risk",
-                "Disabled auto-renew = strong churn signal",
-                "Trial customers more likely to churn",
-                "Downgrade activity signals dissatisfaction",
-                "Single-seat customers churn easily",
-                "Monthly billing shows less commitment",
-                "Lack of upgrades indicates low engagement",
-                "Newer accounts have higher risk"
-            ]
-        }
-        
-        import pandas as pd
-        features_df = pd.DataFrame(features_data)
+        # Display as styled table
+        st.markdown(_styled_features_html(), unsafe_allow_html=True)
         
-        # Display as interactive table
-        st.dataframe(
-            features_df.style.background_gradient(subset=['Importance'], cmap='RdYlGn'),
-            use_container_width=True
-        )
-        
-        # Visualization
-        import plotly.express as px
-        fig = px.bar(
-            features_df.sort_values('Importance', ascending=True),
-            y='Feature',
-            x='Importance',
-            orientation='h',
-            title='Feature Importance for Churn Prediction',
-            labels={'Importance': 'Importance Score (0-100)', 'Feature': 'Feature Name'},
-            color='Importance',
-            color_continuous_scale='RdYlGn'
-        )
-        fig.update_layout(height=500)
-        st.plotly_chart(fig, use_container_width=True)
+        # Visualization, built only when requested
+        _chart_toggle("📊 Show chart", "chart_top_features", _features_figure)
         
         # Detailed explanations
         with st.expander("📖 Detailed Feature Explanations"):
-            for _, row in features_df.iterrows():
-                st.write(f"**{row['Feature']}** (Score: {row['Importance']}/100)")
-                st.write(f"_{row['Impact']}_")
+            for feature, importance, impact in zip(_FEATURES_DATA["Feature"],
+                                                   _FEATURES_DATA["Importance"],
+                                                   _FEATURES_DATA["Impact"]):
+                st.write(f"**{feature}** (Score: {importance}/100)")
+                st.write(f"_{impact}_")
                 st.write("")
     
+    def _plan_stats(self) -> pd.DataFrame:
+        """Per plan tier: non-null customer_id count and mean/min/max churn probability."""
+        codes, tiers = pd.factorize(self.predictions_df['plan_tier'], sort=True)
+        valid = codes >= 0
+        has_id = self.predictions_df['customer_id'].notna().to_numpy()
+        counts = np.bincount(codes[valid & has_id], minlength=len(tiers))
+        means, mins, maxs = _group_stats(codes[valid], self._probs[valid], len(tiers))
+        return pd.DataFrame({
+            ('customer_id', 'count'): counts,
+            ('churn_probability', 'mean'): means,
+            ('churn_probability', 'min'): mins,
+            ('churn_probability', 'max'): maxs,
+        }, index=pd.Index(tiers, name='plan_tier')).round(4)
+    
+    @_requires_predictions
     def segment_by_plan(self, entities: Dict) -> None:
         """Segment customers by plan tier."""
-        if self.predictions_df is None or self.predictions_df.empty:
-            st.warning("No prediction data available.")
-            return
-        
         if 'plan_tier' not in self.predictions_df.columns:
             st.warning("Plan tier information not available in predictions.")
             return
         
         st.write("### Customers by Plan Tier")
         
-        plan_stats = self.predictions_df.groupby('plan_tier').agg({
-            'customer_id': 'count',
-            'churn_probability': ['mean', 'min', 'max']
-        }).round(4)
-        
-        st.dataframe(plan_stats)
+        st.dataframe(self._plan_stats())
         
-        # Visualization
-        fig = px.box(self.predictions_df, x='plan_tier', y='churn_probability',
-                    title='Churn Probability by Plan Tier',
-                    labels={'plan_tier': 'Plan Tier', 'churn_probability': 'Churn Probability'})
-        st.plotly_chart(fig, use_container_width=True)
+        # Visualization, built only when requested
+        _chart_toggle("📊 Show chart", "chart_plan_tiers", lambda: _plan_box_figure(self.predictions_df))
     
+    @_requires_predictions
     def show_trial_customers(self, entities: Dict) -> None:
         """Show customers on trial."""
-        if self.predictions_df is None or self.predictions_df.empty:
-            st.warning("No prediction data available.")
-            return
-        
         if 'is_trial' not in self.predictions_df.columns:
             st.warning("Trial information not available in predictions.")
             return
         
-        trial_customers = self.predictions_df[self.predictions_df['is_trial'] == 1]
+        trial_customers = self.predictions_df.iloc[self._trial_mask]
         
         st.write("### Trial Customers")
         st.write(f"Found **{len(trial_customers)}** customers on trial")
         
         if not trial_customers.empty:
-            avg_trial_churn = trial_customers['churn_probability'].mean()
+            avg_trial_churn = np.nanmean(self._probs[self._trial_mask])
             st.metric("Average Churn Probability for Trial Customers", f"{avg_trial_churn:.2%}")
-            st.dataframe(trial_customers)
+            st.dataframe(self._display_frame(trial_customers.head(MAX_DISPLAY_ROWS)))
     
     def handle_unknown(self, entities: Dict) -> None:
         """Handle unknown intents."""
@@ -1,16 +1,24 @@
 import streamlit as st
 import pandas as pd
+from google.cloud import bigquery
 from data_handler import get_churn_data, get_subscription_data, store_predictions
-from model_trainer import train_model
+from model_trainer import train_model, TRAINING_COLUMNS
 from predictor import ChurnPredictor
 from rag_analytics import ChurnAnalyticsRAG
 from analytics_handlers import AnalyticsHandlers
 from nl_to_sql_rag import NLtoSQLRAG, format_query_results
 from chatbot_assistant import ChurnChatbot
+import io
 import os
+import time
+import traceback
+import numpy as np
+import threading
+from collections import deque
 import matplotlib.pyplot as plt
 import shap
-import plotly.express as px
+import plotly.graph_objects as go
+import sklearn
 
 # --- Configuration --- #
 PROJECT_ID = "hackathon-475722"
@@ -23,20 +31,118 @@ PREDICTIONS_TABLE_ID = "churn_predictions"
 
 MODEL_PATH = './model/churn_model.joblib'
 
-def take_action(predictions_df):
+# Model input schema shared by manual and real-time predictions, plus simulation option pools
+FEATURE_ORDER = ['customer_id', 'seats', 'mrr_amount', 'arr_amount', 'plan_tier', 'is_trial',
+                 'upgrade_flag', 'downgrade_flag', 'billing_frequency', 'auto_renew_flag']
+FEATURE_DTYPES = {'seats': 'int32', 'mrr_amount': 'float32', 'arr_amount': 'float32',
+                  'is_trial': 'int8', 'upgrade_flag': 'int8', 'downgrade_flag': 'int8', 'auto_renew_flag': 'int8'}
+PLAN_TIERS = ('Basic', 'Standard', 'Premium')
+BILLING_FREQUENCIES = ('Monthly', 'Annually')
+SIMULATION_EVENTS = 100
+# Chat messages kept in session state, and how many recent turns are sent to the chatbot
+CHAT_HISTORY_LIMIT = 50
+CHAT_CONTEXT_TURNS = 10
+# Query results longer than this are aggregated by the x column before charting
+CHART_AGGREGATE_THRESHOLD = 500
+HIGH_RISK_THRESHOLD = 0.75
+# How often a session rechecks the predictions table for writes made elsewhere
+PREDICTIONS_REFRESH_SECONDS = 300
+# Bound on the per-input prediction and SHAP plot caches: they are shared by every
+# session and keyed on uploaded frames, so old entries are evicted and expire
+PREDICTION_CACHE_ENTRIES = 32
+PREDICTION_CACHE_TTL_SECONDS = 3600
+# Features shown in the single-prediction SHAP bar chart
+TOP_CONTRIBUTIONS = 8
+
+def high_risk_mask(predictions_df):
+    """Boolean ndarray marking rows whose churn probability exceeds HIGH_RISK_THRESHOLD."""
+    return predictions_df['churn_probability'].to_numpy() > HIGH_RISK_THRESHOLD
+
+def take_action(predictions_df, mask=None):
     st.subheader("Agentic Actions")
-    high_risk_customers = predictions_df[predictions_df['churn_probability'] > 0.75]
+    if mask is None:
+        mask = high_risk_mask(predictions_df)
+    high_risk_customers = predictions_df.loc[mask, ['customer_id', 'churn_probability']]
 
     if not high_risk_customers.empty:
         st.write("High-risk customers identified. Suggested actions:")
-        for index, row in high_risk_customers.iterrows():
-            st.write(f"- **Customer {row['customer_id']}**: High churn probability ({row['churn_probability']:.2f}).")
-            st.write("  - Action: Send a personalized retention email.")
-            st.write("  - Action: Offer a 10% discount on the next bill.")
-            st.write("  - Action: Schedule a follow-up call from a customer success manager.")
+        # Build every customer's action list from plain arrays, then render once
+        ids = high_risk_customers['customer_id'].to_numpy()
+        probs = high_risk_customers['churn_probability'].to_numpy()
+        lines = [
+            f"- **Customer {customer_id}**: High churn probability ({prob:.2f}).\n"
+            "  - Action: Send a personalized retention email.\n"
+            "  - Action: Offer a 10% discount on the next bill.\n"
+            "  - Action: Schedule a follow-up call from a customer success manager."
+            for customer_id, prob in zip(ids, probs)
+        ]
+        st.markdown("\n".join(lines))
     else:
         st.write("No high-risk customers identified.")
 
+@st.cache_resource
+def _bq_client(project_id):
+    """Create one BigQuery client per project and share it (and its auth/HTTP session) across reruns."""
+    return bigquery.Client(project=project_id)
+
+@st.cache_data(ttl=PREDICTIONS_REFRESH_SECONDS, show_spinner=False)
+def _cached_churn_data(project_id, dataset_id, table_id, modified_ts=None):
+    """Cached wrapper around get_churn_data for the interactive (read-only) views; modified_ts keys the table version."""
+    try:
+        client = _bq_client(project_id)
+    except Exception:
+        client = None  # get_churn_data falls back to the local cache
+    return get_churn_data(project_id, dataset_id, table_id, arrow_dtypes=True, client=client)
+
+def _table_metadata(project_id, dataset_id, table_id):
+    """BigQuery table metadata (one API call), or None when it can't be read."""
+    try:
+        return _bq_client(project_id).get_table(f"{project_id}.{dataset_id}.{table_id}")
+    except Exception:
+        return None
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_training_data(project_id, dataset_id, table_id, modified_ts, _table=None):
+    """
+    Training columns of the table; modified_ts keys the cache so a changed table is re-read.
+
+    The same table metadata is handed to get_churn_data, whose local Parquet cache is
+    validated against it, so a new modified_ts never falls through to stale files.
+    """
+    try:
+        client = _bq_client(project_id)
+    except Exception:
+        client = None  # get_churn_data falls back to the local cache
+    return get_churn_data(project_id, dataset_id, table_id, client=client, columns=TRAINING_COLUMNS, table=_table)
+
+def _predictions_df():
+    """
+    Prediction data, read through the shared cache on every rerun.
+
+    The session keeps only a (table modified time, refresh bucket) token. The table
+    metadata is rechecked once per PREDICTIONS_REFRESH_SECONDS, or right after this
+    session stores predictions, so writes from other sessions and instances show up.
+    """
+    bucket = int(time.time() // PREDICTIONS_REFRESH_SECONDS)
+    token = st.session_state.get('pred_df_token')
+    if token is None or token[1] != bucket or st.session_state.get('pred_df_stale', False):
+        table = _table_metadata(PROJECT_ID, PREDICTIONS_DATASET_ID, PREDICTIONS_TABLE_ID)
+        modified_ts = table.modified.timestamp() if table is not None and table.modified else None
+        token = st.session_state.pred_df_token = (modified_ts, bucket)
+        st.session_state.pred_df_stale = False
+    return _cached_churn_data(PROJECT_ID, PREDICTIONS_DATASET_ID, PREDICTIONS_TABLE_ID, token[0])
+
+def _store_predictions(predictions_df):
+    """Store predictions in BigQuery and invalidate the cached prediction data."""
+    store_predictions(PROJECT_ID, PREDICTIONS_DATASET_ID, PREDICTIONS_TABLE_ID, predictions_df, client=_bq_client(PROJECT_ID))
+    _cached_churn_data.clear()
+    st.session_state.pred_df_stale = True
+
+@st.cache_resource(max_entries=1)
+def _load_predictor(model_path, model_mtime):
+    """Load and cache the predictor; model_mtime invalidates the cache after retraining, evicting the old model."""
+    return ChurnPredictor(model_path=model_path)
+
 @st.cache_resource
 def get_rag_system():
     """Initialize and cache the RAG system."""
@@ -48,6 +154,33 @@ def get_chatbot():
     # Set use_gemini=True if you have GOOGLE_API_KEY configured
     return ChurnChatbot(project_id=PROJECT_ID, use_gemini=False)
 
+@st.cache_resource
+def get_nl_to_sql_rag():
+    """Initialize and cache the NL-to-SQL RAG system."""
+    try:
+        return NLtoSQLRAG(project_id=PROJECT_ID, dataset_id=CHURN_DATASET_ID, table_id=CHURN_TABLE_ID)
+    except Exception as e:
+        st.error(f"Error initializing SQL RAG system: {e}")
+        return None
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _sql_schema_description(project_id, dataset_id, table_id):
+    """Schema markdown for the SQL interface, keyed on the table it describes."""
+    return get_nl_to_sql_rag().get_schema_description()
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _sql_example_queries(project_id, dataset_id, table_id):
+    """Example questions for the SQL interface, keyed on the table they target."""
+    return get_nl_to_sql_rag().get_example_queries()
+
+def _chart_data(results_df, x_col, y_col):
+    """Return x/y arrays for a query result chart, summed per x value when the result is large."""
+    if len(results_df) > CHART_AGGREGATE_THRESHOLD and x_col != y_col:
+        plot_df = results_df.groupby(x_col, as_index=False, sort=True)[y_col].sum()
+    else:
+        plot_df = results_df
+    return plot_df[x_col].to_numpy(), plot_df[y_col].to_numpy()
+
 def answer_question(question):
     """
     RAG-based question answering system with semantic understanding.
@@ -61,7 +194,7 @@ def answer_question(question):
     # Fetch predictions data
     predictions_df = None
     try:
-        predictions_df = get_churn_data(PROJECT_ID, PREDICTIONS_DATASET_ID, PREDICTIONS_TABLE_ID)
+        predictions_df = _predictions_df()
     except Exception as e:
         st.warning(f"Could not fetch predictions from BigQuery: {e}")
         st.info("Using RAG system without live data. Train a model and make predictions for full functionality.")
@@ -108,6 +241,268 @@ def answer_question(question):
             for i, match in enumerate(response['all_matches'][1:], 2):
                 st.write(f"{i}. {match['description']} (confidence: {match['confidence']:.0%})")
 
+def _frame_key(df):
+    """Content key for an input frame, hashed once and shared by the prediction and plot caches."""
+    return (tuple(df.columns), len(df), int(pd.util.hash_pandas_object(df).sum()))
+
+@st.cache_data(max_entries=PREDICTION_CACHE_ENTRIES, ttl=PREDICTION_CACHE_TTL_SECONDS, show_spinner=False)
+def _cached_predict_and_explain(_predictor, model_mtime, input_key, _input_df):
+    """Memoize predictions + SHAP values per model version and input frame key."""
+    return _predictor.predict_and_explain(_input_df)
+
+@st.cache_resource
+def _pyplot_lock():
+    """
+    One lock for all pyplot drawing in the process.
+
+    SHAP draws through pyplot's global current figure, so two sessions drawing at
+    once (even different plot kinds) would interleave. Cached rather than a module
+    global because this script is re-executed on every rerun.
+    """
+    return threading.Lock()
+
+@st.cache_resource
+def _shap_figure(kind):
+    """Persistent matplotlib figure per SHAP plot kind, reused across reruns instead of reallocated."""
+    fig, _ = plt.subplots(figsize=(10, 4) if kind == 'waterfall' else (10, 6))
+    return fig
+
+@st.cache_data(max_entries=PREDICTION_CACHE_ENTRIES, ttl=PREDICTION_CACHE_TTL_SECONDS, show_spinner=False)
+def _shap_plot_png(kind, model_mtime, input_key, _shap_explanation):
+    """Render a SHAP plot to PNG bytes once per model version and input, so reruns skip matplotlib."""
+    buf = io.BytesIO()
+    with _pyplot_lock():
+        fig = _shap_figure(kind)
+        fig.clear()
+        plt.figure(fig.number)
+        if kind == 'waterfall':
+            shap.plots.waterfall(_shap_explanation[0], show=False)
+        else:
+            shap.plots.beeswarm(_shap_explanation, show=False)
+        fig.savefig(buf, format='png', dpi=90, bbox_inches='tight')
+    return buf.getvalue()
+
+@st.fragment
+def _run_manual_prediction(predictor):
+    """Manual input form; runs as a fragment so its widgets only rerun this section."""
+    st.subheader("Enter Customer Data for Prediction")
+    # Placeholder for manual input fields - this will be extensive
+    # For demonstration, let's just ask for a few key features
+    st.write("Please provide values for the following features:")
+    
+    # Example manual inputs (you'll need to expand this based on your actual features)
+    customer_id = st.text_input("Customer ID", "C12345")
+    seats = st.number_input("Seats", min_value=0, value=1)
+    mrr_amount = st.number_input("MRR Amount", min_value=0, value=50)
+    arr_amount = st.number_input("ARR Amount", min_value=0, value=600)
+    plan_tier = st.selectbox("Plan Tier", ['basic', 'standard', 'premium']) # Example values, adjust as per your data
+    is_trial = st.selectbox("Is Trial", [True, False])
+    upgrade_flag = st.selectbox("Upgrade Flag", [True, False])
+    downgrade_flag = st.selectbox("Downgrade Flag", [True, False])
+    billing_frequency = st.selectbox("Billing Frequency", ['Monthly', 'Annually']).lower() # Example values
+    auto_renew_flag = st.selectbox("Auto Renew Flag", [True, False])
+
+    # Create a single-row DataFrame from manual input in one allocation
+    row = {
+        'customer_id': customer_id,
+        'seats': seats,
+        'mrr_amount': mrr_amount,
+        'arr_amount': arr_amount,
+        'plan_tier': plan_tier,
+        'is_trial': int(is_trial),
+        'upgrade_flag': int(upgrade_flag),
+        'downgrade_flag': int(downgrade_flag),
+        'billing_frequency': billing_frequency,
+        'auto_renew_flag': int(auto_renew_flag),
+    }
+    manual_input_data = pd.DataFrame.from_records([row], columns=FEATURE_ORDER).astype(FEATURE_DTYPES)
+
+    try:
+        model_mtime = os.path.getmtime(MODEL_PATH)
+        # The widget values already identify the row; no need to hash the frame
+        input_key = tuple(row.items())
+        if st.button("Predict Churn (Manual)"):
+            predictions_df, shap_explanation = _cached_predict_and_explain(predictor, model_mtime, input_key, manual_input_data)
+            st.session_state.manual_result = ((model_mtime, input_key), predictions_df, shap_explanation)
+        # For single prediction, use waterfall plot
+        _show_prediction_result('manual', (model_mtime, input_key), 'waterfall', "### Prediction Explanations:")
+    except Exception as e:
+        st.error(f"Error during manual prediction: {e}")
+        st.error(traceback.format_exc())
+
+@st.fragment
+def _run_csv_prediction(predictor, df_to_predict):
+    """Batch prediction for an uploaded CSV; runs as a fragment like the manual form."""
+    try:
+        model_mtime = os.path.getmtime(MODEL_PATH)
+        input_key = _frame_key(df_to_predict)
+        if st.button("Predict Churn (CSV)"):
+            predictions_df, shap_explanation = _cached_predict_and_explain(predictor, model_mtime, input_key, df_to_predict)
+            st.session_state.csv_result = ((model_mtime, input_key), predictions_df, shap_explanation)
+        _show_prediction_result('csv', (model_mtime, input_key), 'beeswarm', "### Prediction Explanations (Summary Plot):")
+    except Exception as e:
+        st.error(f"Error during CSV prediction: {e}")
+        st.error(traceback.format_exc())
+
+def _top_contributions_figure(shap_explanation, k=TOP_CONTRIBUTIONS):
+    """Horizontal bar chart of the k largest |SHAP| contributions for the first row."""
+    values = np.asarray(shap_explanation.values[0])
+    k = min(k, values.shape[0])
+    top = np.argpartition(np.abs(values), -k)[-k:]
+    top = top[np.argsort(np.abs(values[top]))]  # ascending, so the largest bar is drawn on top
+    names = np.asarray(shap_explanation.feature_names)[top]
+    fig = go.Figure(data=[go.Bar(
+        x=values[top], y=names, orientation='h',
+        marker_color=np.where(values[top] > 0, '#ff0051', '#008bfb'),
+    )])
+    fig.update_layout(xaxis_title="SHAP value (log-odds contribution)", height=60 + 30 * k,
+                      margin=dict(l=10, r=10, t=10, b=10))
+    return fig
+
+def _show_prediction_result(mode, result_key, plot_kind, plot_title):
+    """
+    Shows the last manual/CSV prediction while its input is unchanged.
+
+    The result lives in session state, so Store and Take Action act on it on
+    their own rerun instead of needing the Predict button pressed again.
+    """
+    result = st.session_state.get(f"{mode}_result")
+    if result is None or result[0] != result_key:
+        return
+    _, predictions_df, shap_explanation = result
+    model_mtime, input_key = result_key
+
+    st.write("### Prediction Results:")
+    st.dataframe(predictions_df)
+
+    st.write(plot_title)
+    if plot_kind == 'waterfall':
+        # Top contributions are a plotly bar; the full matplotlib waterfall is only rendered on request
+        st.plotly_chart(_top_contributions_figure(shap_explanation), use_container_width=True)
+        if st.toggle("Show full waterfall plot", key=f"waterfall_{mode}"):
+            st.image(_shap_plot_png('waterfall', model_mtime, input_key, shap_explanation), use_container_width=True)
+    else:
+        st.image(_shap_plot_png(plot_kind, model_mtime, input_key, shap_explanation), use_container_width=True)
+
+    if st.button("Store Predictions in BigQuery", key=f"store_{mode}"):
+        _store_predictions(predictions_df)
+        st.success("Predictions stored in BigQuery.")
+
+    if st.button("Take Action", key=f"take_action_{mode}"):
+        take_action(predictions_df)
+
+def _simulation_events(n):
+    """Generate n synthetic customer events in one vectorized pass, typed like the manual input row."""
+    rng = np.random.default_rng()
+    mrr_amount = rng.integers(10, 201, size=n)
+    # The four 0/1 flags come from one int8 draw, already in their model dtype
+    flags = rng.integers(0, 2, size=(4, n), dtype=np.int8)
+    return pd.DataFrame({
+        'customer_id': np.char.add('C', rng.integers(10000, 100000, size=n).astype(str)),
+        'seats': rng.integers(1, 11, size=n),
+        'mrr_amount': mrr_amount,
+        'arr_amount': mrr_amount * 12,
+        'plan_tier': rng.choice(PLAN_TIERS, size=n),
+        'is_trial': flags[0],
+        'upgrade_flag': flags[1],
+        'downgrade_flag': flags[2],
+        'billing_frequency': rng.choice(BILLING_FREQUENCIES, size=n),
+        'auto_renew_flag': flags[3],
+    }, columns=FEATURE_ORDER).astype(FEATURE_DTYPES)
+
+@st.fragment(run_every="2s")
+def _simulate_event():
+    """Reveal one pre-scored simulated event per fragment tick."""
+    if not st.session_state.get('sim_running'):
+        if st.session_state.get('sim_counter', 0) >= SIMULATION_EVENTS:
+            st.success(f"Simulation finished after {SIMULATION_EVENTS} events.")
+        return
+
+    # All events were generated and scored in a single predict call when the simulation started
+    i = st.session_state.sim_counter
+    predictions_df = st.session_state.sim_predictions.iloc[[i]]
+    st.session_state.sim_counter += 1
+    finished = st.session_state.sim_counter >= SIMULATION_EVENTS
+
+    st.write(f"**New Event for Customer {predictions_df['customer_id'].iat[0]}** "
+             f"({st.session_state.sim_counter}/{SIMULATION_EVENTS})")
+    st.dataframe(predictions_df)
+    mask = high_risk_mask(predictions_df)
+    if mask.any():
+        st.warning(f"High churn risk detected for customer {predictions_df['customer_id'].iat[0]}!")
+        take_action(predictions_df, mask)
+
+    if finished:
+        st.session_state.sim_running = False
+        # A full rerun so the Stop button outside the fragment disappears
+        st.rerun()
+
+def _recent_chat_messages():
+    """The last CHAT_CONTEXT_TURNS exchanges of the chat history."""
+    return list(st.session_state.chat_messages)[-2 * CHAT_CONTEXT_TURNS:]
+
+@st.fragment
+def _chatbot_panel(chatbot, predictions_df):
+    """Chat history, quick questions and input; reruns on its own without the rest of the page."""
+    # Initialize chat history in session state
+    if "chat_messages" not in st.session_state:
+        st.session_state.chat_messages = deque(maxlen=CHAT_HISTORY_LIMIT)
+    
+    # Display chat history
+    for message in st.session_state.chat_messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+    
+    # Quick action buttons
+    st.write("**Quick Questions:**")
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        if st.button("📊 Show high-risk customers", key="quick_high_risk"):
+            quick_question = "Which customers are most likely to churn?"
+            st.session_state.chat_messages.append({"role": "user", "content": quick_question})
+            response = chatbot.generate_response(quick_question, predictions_df, _recent_chat_messages())
+            st.session_state.chat_messages.append({"role": "assistant", "content": response})
+            st.rerun(scope="fragment")
+    
+    with col2:
+        if st.button("🎯 Explain the model", key="quick_model"):
+            quick_question = "How does the churn prediction model work?"
+            st.session_state.chat_messages.append({"role": "user", "content": quick_question})
+            response = chatbot.generate_response(quick_question, predictions_df, _recent_chat_messages())
+            st.session_state.chat_messages.append({"role": "assistant", "content": response})
+            st.rerun(scope="fragment")
+    
+    with col3:
+        if st.button("💰 Revenue at risk", key="quick_revenue"):
+            quick_question = "How much revenue is at risk from churn?"
+            st.session_state.chat_messages.append({"role": "user", "content": quick_question})
+            response = chatbot.generate_response(quick_question, predictions_df, _recent_chat_messages())
+            st.session_state.chat_messages.append({"role": "assistant", "content": response})
+            st.rerun(scope="fragment")
+    
+    # Chat input
+    if user_prompt := st.chat_input("Ask me anything about churn predictions..."):
+        # Add user message to history and display
+        st.session_state.chat_messages.append({"role": "user", "content": user_prompt})
+        with st.chat_message("user"):
+            st.markdown(user_prompt)
+        
+        # Stream the assistant response as it is generated
+        with st.chat_message("assistant"):
+            response = st.write_stream(
+                chatbot.generate_response(user_prompt, predictions_df, _recent_chat_messages(), stream=True)
+            )
+        
+        # Add assistant response to history
+        st.session_state.chat_messages.append({"role": "assistant", "content": response})
+    
+    # Clear chat button
+    if st.button("🗑️ Clear Chat History", key="clear_chat"):
+        st.session_state.chat_messages.clear()
+        chatbot.reset_conversation()
+        st.rerun(scope="fragment")
+
 # --- Streamlit App --- #
 # Display header image (contains all branding and title)
 st.image(
@@ -135,7 +530,9 @@ if st.sidebar.button("Train New Model"):
         # For simplicity, let's assume get_churn_data returns the combined dataset for training
         # You might need to adjust get_churn_data or add a merge step here
         st.write(f"Using Project ID: {PROJECT_ID}")
-        training_data = get_churn_data(PROJECT_ID, CHURN_DATASET_ID, CHURN_TABLE_ID)
+        table = _table_metadata(PROJECT_ID, CHURN_DATASET_ID, CHURN_TABLE_ID)
+        modified_ts = table.modified.timestamp() if table is not None and table.modified else None
+        training_data = _cached_training_data(PROJECT_ID, CHURN_DATASET_ID, CHURN_TABLE_ID, modified_ts, table)
         train_model(training_data, model_path=MODEL_PATH)
         st.success("Model trained successfully!")
     except Exception as e:
@@ -152,8 +549,12 @@ prediction_mode = st.sidebar.radio(
 predictor = None
 if os.path.exists(MODEL_PATH):
     try:
-        predictor = ChurnPredictor(model_path=MODEL_PATH)
+        predictor = _load_predictor(MODEL_PATH, os.path.getmtime(MODEL_PATH))
         st.sidebar.success("✓ Model loaded successfully!")
+        if predictor.trained_sklearn_version is not None:
+            # Cross-version models usually still work; flag the mismatch instead of refusing to load
+            st.sidebar.warning(f"This model was trained with scikit-learn {predictor.trained_sklearn_version} "
+                               f"(installed: {sklearn.__version__}). If predictions fail, click 'Train New Model' to retrain it.")
     except Exception as e:
         st.error(f"Error loading model: {e}")
         st.error("This usually happens when the model was trained with a different scikit-learn version.")
@@ -164,62 +565,7 @@ else:
 
 if predictor:
     if prediction_mode == "Manual Input":
-        st.subheader("Enter Customer Data for Prediction")
-        # Placeholder for manual input fields - this will be extensive
-        # For demonstration, let's just ask for a few key features
-        st.write("Please provide values for the following features:")
-        
-        # Example manual inputs (you'll need to expand this based on your actual features)
-        customer_id = st.text_input("Customer ID", "C12345")
-        seats = st.number_input("Seats", min_value=0, value=1)
-        mrr_amount = st.number_input("MRR Amount", min_value=0, value=50)
-        arr_amount = st.number_input("ARR Amount", min_value=0, value=600)
-        plan_tier = st.selectbox("Plan Tier", ['basic', 'standard', 'premium']) # Example values, adjust as per your data
-        is_trial = st.selectbox("Is Trial", [True, False])
-        upgrade_flag = st.selectbox("Upgrade Flag", [True, False])
-        downgrade_flag = st.selectbox("Downgrade Flag", [True, False])
-        billing_frequency = st.selectbox("Billing Frequency", ['Monthly', 'Annually']) # Example values
-        auto_renew_flag = st.selectbox("Auto Renew Flag", [True, False])
-
-        # Create a DataFrame from manual input
-        manual_input_data = pd.DataFrame({
-            'customer_id': [customer_id],
-            'seats': [seats],
-            'mrr_amount': [mrr_amount],
-            'arr_amount': [arr_amount],
-            'is_trial': [int(is_trial)],
-            'upgrade_flag': [int(upgrade_flag)],
-            'downgrade_flag': [int(downgrade_flag)],
-            'auto_renew_flag': [int(auto_renew_flag)],
-        })
-        manual_input_data['plan_tier'] = plan_tier.lower()
-        manual_input_data['billing_frequency'] = billing_frequency.lower()
-
-        if st.button("Predict Churn (Manual)"):
-            try:
-                predictions_df, shap_explanation = predictor.predict_and_explain(manual_input_data)
-                st.write("### Prediction Results:")
-                st.dataframe(predictions_df)
-
-                st.write("### Prediction Explanations:")
-                # For single prediction, use waterfall plot
-                import matplotlib.pyplot as plt
-                fig, ax = plt.subplots(figsize=(10, 4))
-                shap.plots.waterfall(shap_explanation[0], show=False)
-                st.pyplot(fig)
-                plt.close()
-
-                if st.checkbox("Store Predictions in BigQuery?"):
-                    store_predictions(PROJECT_ID, PREDICTIONS_DATASET_ID, PREDICTIONS_TABLE_ID, predictions_df)
-                    st.success("Predictions stored in BigQuery.")
-
-                if st.button("Take Action"):
-                    take_action(predictions_df)
-
-            except Exception as e:
-                st.error(f"Error during manual prediction: {e}")
-                import traceback
-                st.error(traceback.format_exc())
+        _run_manual_prediction(predictor)
 
     elif prediction_mode == "Upload CSV":
         st.subheader("Upload CSV for Batch Prediction")
@@ -227,30 +573,13 @@ if predictor:
 
         if uploaded_file is not None:
             try:
-                df_to_predict = pd.read_csv(uploaded_file)
+                df_to_predict = pd.read_csv(uploaded_file, engine="pyarrow")
                 st.write("### Uploaded Data Preview:")
                 st.dataframe(df_to_predict.head())
 
-                if st.button("Predict Churn (CSV)"):
-                    predictions_df, shap_explanation = predictor.predict_and_explain(df_to_predict)
-                    st.write("### Prediction Results:")
-                    st.dataframe(predictions_df)
-
-                    st.write("### Prediction Explanations (Summary Plot):")
-                    fig, ax = plt.subplots(figsize=(10, 6))
-                    shap.plots.beeswarm(shap_explanation, show=False)
-                    st.pyplot(fig)
-                    plt.close()
-
-                    if st.checkbox("Store Predictions in BigQuery?"):
-                        store_predictions(PROJECT_ID, PREDICTIONS_DATASET_ID, PREDICTIONS_TABLE_ID, predictions_df)
-                        st.success("Predictions stored in BigQuery.")
-
-                    if st.button("Take Action"):
-                        take_action(predictions_df)
+                _run_csv_prediction(predictor, df_to_predict)
             except Exception as e:
                 st.error(f"Error during CSV prediction: {e}")
-                import traceback
                 st.error(traceback.format_exc())
 
     elif prediction_mode == "Real-time Prediction":
@@ -258,46 +587,13 @@ if predictor:
         st.write("Simulating a real-time stream of customer events...")
 
         if st.button("Start Real-time Simulation"):
-            import time
-            import random
-
-            placeholder = st.empty()
-
-            for i in range(100): # Simulate 100 events
-                with placeholder.container():
-                    customer_id = f"C{random.randint(10000, 99999)}"
-                    seats = random.randint(1, 10)
-                    mrr_amount = random.randint(10, 200)
-                    arr_amount = mrr_amount * 12
-                    plan_tier = random.choice(['Basic', 'Standard', 'Premium'])
-                    is_trial = random.choice([True, False])
-                    upgrade_flag = random.choice([True, False])
-                    downgrade_flag = random.choice([True, False])
-                    billing_frequency = random.choice(['Monthly', 'Annually'])
-                    auto_renew_flag = random.choice([True, False])
-
-                    real_time_data = pd.DataFrame({
-                        'customer_id': [customer_id],
-                        'seats': [seats],
-                        'mrr_amount': [mrr_amount],
-                        'arr_amount': [arr_amount],
-                        'plan_tier': [plan_tier],
-                        'is_trial': [is_trial],
-                        'upgrade_flag': [upgrade_flag],
-                        'downgrade_flag': [downgrade_flag],
-                        'billing_frequency': [billing_frequency],
-                        'auto_renew_flag': [auto_renew_flag],
-                    })
-
-                    st.write(f"**New Event for Customer {customer_id}**")
-                    predictions_df, _ = predictor.predict_and_explain(real_time_data)
-                    st.dataframe(predictions_df)
-
-                    if predictions_df['churn_probability'].iloc[0] > 0.75:
-                        st.warning(f"High churn risk detected for customer {customer_id}!")
-                        take_action(predictions_df)
-
-                    time.sleep(2) # Wait for 2 seconds before the next event
+            st.session_state.sim_predictions = predictor.predict(_simulation_events(SIMULATION_EVENTS))
+            st.session_state.sim_running = True
+            st.session_state.sim_counter = 0
+        if st.session_state.get('sim_running') and st.button("Stop Simulation"):
+            st.session_state.sim_running = False
+
+        _simulate_event()
 st.sidebar.header("Augmented Analytics")
 question = st.sidebar.text_input("Ask a question about your churn data")
 if st.sidebar.button("Get Answer"):
@@ -314,25 +610,16 @@ if st.session_state.get('show_sql_interface', False):
     st.write("Ask questions in plain English, and I'll translate them to SQL and execute them on BigQuery!")
     
     # Initialize NL-to-SQL RAG system
-    @st.cache_resource
-    def get_nl_to_sql_rag():
-        """Initialize and cache the NL-to-SQL RAG system."""
-        try:
-            return NLtoSQLRAG(project_id=PROJECT_ID, dataset_id=CHURN_DATASET_ID, table_id=CHURN_TABLE_ID)
-        except Exception as e:
-            st.error(f"Error initializing SQL RAG system: {e}")
-            return None
-    
     nl_sql_rag = get_nl_to_sql_rag()
     
     if nl_sql_rag:
         # Show schema information
         with st.expander("📊 View Available Data Schema"):
-            st.markdown(nl_sql_rag.get_schema_description())
+            st.markdown(_sql_schema_description(PROJECT_ID, CHURN_DATASET_ID, CHURN_TABLE_ID))
         
         # Show example queries
         with st.expander("💡 Example Questions You Can Ask"):
-            examples = nl_sql_rag.get_example_queries()
+            examples = _sql_example_queries(PROJECT_ID, CHURN_DATASET_ID, CHURN_TABLE_ID)
             cols = st.columns(2)
             for i, example in enumerate(examples):
                 with cols[i % 2]:
@@ -409,14 +696,23 @@ if st.session_state.get('show_sql_interface', False):
                         # Display as interactive dataframe
                         st.dataframe(results_df, use_container_width=True)
                         
-                        # Add download button
-                        csv = results_df.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            label="📥 Download Results as CSV",
-                            data=csv,
-                            file_name="query_results.csv",
-                            mime="text/csv",
-                        )
+                        # Add download buttons: compact columnar Parquet, with CSV as fallback.
+                        # Each file is only serialized when its button is clicked.
+                        dl_col1, dl_col2 = st.columns(2)
+                        with dl_col1:
+                            st.download_button(
+                                label="📥 Download Results as Parquet",
+                                data=lambda: results_df.to_parquet(index=False, compression='zstd'),
+                                file_name="query_results.parquet",
+                                mime="application/octet-stream",
+                            )
+                        with dl_col2:
+                            st.download_button(
+                                label="📥 Download Results as CSV",
+                                data=lambda: results_df.to_csv(index=False).encode('utf-8'),
+                                file_name="query_results.csv",
+                                mime="text/csv",
+                            )
                         
                         # Auto-generate visualizations for certain result types
                         st.subheader("📈 Visualizations")
@@ -432,25 +728,25 @@ if st.session_state.get('show_sql_interface', False):
                                     ["Bar Chart", "Line Chart", "Pie Chart", "Table Only"]
                                 )
                                 
+                                x_col = results_df.columns[0]
+                                y_col = numeric_cols[0]
+                                x_values, y_values = _chart_data(results_df, x_col, y_col)
+                                
                                 if chart_type == "Bar Chart":
-                                    x_col = results_df.columns[0]
-                                    y_col = numeric_cols[0]
-                                    fig = px.bar(results_df, x=x_col, y=y_col, 
-                                               title=f"{y_col} by {x_col}")
+                                    fig = go.Figure(data=[go.Bar(x=x_values, y=y_values)])
+                                    fig.update_layout(title=f"{y_col} by {x_col}",
+                                                      xaxis_title=x_col, yaxis_title=y_col)
                                     st.plotly_chart(fig, use_container_width=True)
                                 
                                 elif chart_type == "Line Chart":
-                                    x_col = results_df.columns[0]
-                                    y_col = numeric_cols[0]
-                                    fig = px.line(results_df, x=x_col, y=y_col,
-                                                title=f"{y_col} Trend")
+                                    fig = go.Figure(data=[go.Scatter(x=x_values, y=y_values, mode="lines")])
+                                    fig.update_layout(title=f"{y_col} Trend",
+                                                      xaxis_title=x_col, yaxis_title=y_col)
                                     st.plotly_chart(fig, use_container_width=True)
                                 
                                 elif chart_type == "Pie Chart":
-                                    x_col = results_df.columns[0]
-                                    y_col = numeric_cols[0]
-                                    fig = px.pie(results_df, names=x_col, values=y_col,
-                                               title=f"Distribution of {y_col}")
+                                    fig = go.Figure(data=[go.Pie(labels=x_values, values=y_values)])
+                                    fig.update_layout(title=f"Distribution of {y_col}")
                                     st.plotly_chart(fig, use_container_width=True)
                             
                             # For single metrics, show as metric cards
@@ -476,75 +772,11 @@ if st.session_state.get('show_chatbot', False):
     st.header("💬 AI Assistant Chat")
     st.caption("Ask me anything about churn predictions, customer insights, or the system capabilities")
     
-    # Initialize chatbot
-    chatbot = get_chatbot()
-    
-    # Get current prediction data for context
+    # Get current prediction data for context (fetched outside the fragment)
     predictions_df = None
     try:
-        predictions_df = get_churn_data(PROJECT_ID, PREDICTIONS_DATASET_ID, PREDICTIONS_TABLE_ID)
+        predictions_df = _predictions_df()
     except:
         pass
     
-    # Initialize chat history in session state
-    if "chat_messages" not in st.session_state:
-        st.session_state.chat_messages = []
-    
-    # Display chat history
-    for message in st.session_state.chat_messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-    
-    # Quick action buttons
-    st.write("**Quick Questions:**")
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        if st.button("📊 Show high-risk customers", key="quick_high_risk"):
-            quick_question = "Which customers are most likely to churn?"
-            st.session_state.chat_messages.append({"role": "user", "content": quick_question})
-            response = chatbot.generate_response(quick_question, predictions_df, st.session_state.chat_messages)
-            st.session_state.chat_messages.append({"role": "assistant", "content": response})
-            st.rerun()
-    
-    with col2:
-        if st.button("🎯 Explain the model", key="quick_model"):
-            quick_question = "How does the churn prediction model work?"
-            st.session_state.chat_messages.append({"role": "user", "content": quick_question})
-            response = chatbot.generate_response(quick_question, predictions_df, st.session_state.chat_messages)
-            st.session_state.chat_messages.append({"role": "assistant", "content": response})
-            st.rerun()
-    
-    with col3:
-        if st.button("💰 Revenue at risk", key="quick_revenue"):
-            quick_question = "How much revenue is at risk from churn?"
-            st.session_state.chat_messages.append({"role": "user", "content": quick_question})
-            response = chatbot.generate_response(quick_question, predictions_df, st.session_state.chat_messages)
-            st.session_state.chat_messages.append({"role": "assistant", "content": response})
-            st.rerun()
-    
-    # Chat input
-    if user_prompt := st.chat_input("Ask me anything about churn predictions..."):
-        # Add user message to history and display
-        st.session_state.chat_messages.append({"role": "user", "content": user_prompt})
-        with st.chat_message("user"):
-            st.markdown(user_prompt)
-        
-        # Generate and display assistant response
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = chatbot.generate_response(
-                    user_prompt, 
-                    predictions_df,
-                    st.session_state.chat_messages
-                )
-            st.markdown(response)
-        
-        # Add assistant response to history
-        st.session_state.chat_messages.append({"role": "assistant", "content": response})
-    
-    # Clear chat button
-    if st.button("🗑️ Clear Chat History", key="clear_chat"):
-        st.session_state.chat_messages = []
-        chatbot.reset_conversation()
-        st.rerun()
+    _chatbot_panel(get_chatbot(), predictions_df)
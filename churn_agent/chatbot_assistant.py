@@ -5,9 +5,37 @@ model insights, and data analytics.
 """
 
 import os
-from typing import Dict, List, Optional
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Union
+import numpy as np
 import pandas as pd
 
+# Gemini response caching: exact-match LRU size, and the cosine similarity above
+# which a paraphrased question reuses a cached answer for the same data context
+RESPONSE_CACHE_SIZE = 256
+SEMANTIC_CACHE_THRESHOLD = 0.92
+EMBEDDING_MODEL = "models/embedding-001"
+
+# Risk level edges: low < 0.4 <= medium <= 0.7 < high
+RISK_LEVEL_EDGES = np.array([0.4, np.nextafter(0.7, 1.0)])
+
+# Gemini model; override with the GEMINI_MODEL environment variable
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+
+# Fallback intent keywords. Keywords match at the start of a word, so inflections
+# ("models", "explained", "shapley", "helpful", "queries") still route while "which"
+# or "this" no longer read as "hi"; greetings and MRR/ARR must be whole words.
+# Multi-word phrases are matched anywhere, as before.
+_GREETING_PATTERN = re.compile(r'\b(?:hello|hi|hey|greetings)\b')
+_MODEL_PATTERN = re.compile(r'\b(?:model|shap|explain|feature)|how does')
+_RISK_PATTERN = re.compile(r'high risk|at risk')
+_REVENUE_PATTERN = re.compile(r'\b(?:revenue|money)|\b(?:mrr|arr)\b')
+_QUERY_PATTERN = re.compile(r'\b(?:quer|sql|search|find)|show me')
+_HELP_PATTERN = re.compile(r'\b(?:help|capabilit)|what can you')
+
 
 class ChurnChatbot:
     """
@@ -27,6 +55,14 @@ class ChurnChatbot:
         self.use_gemini = use_gemini
         self.model = None
         self.chat_session = None
+        self._genai = None
+        
+        # Response caches (the chatbot is shared across Streamlit sessions, hence the lock)
+        self._cache_lock = threading.Lock()
+        self._exact_cache = OrderedDict()
+        self._sem_data_hash = None
+        self._sem_vectors = np.empty((0, 0), dtype=np.float32)
+        self._sem_responses = []
         
         # System context about the application
         self.system_context = """
@@ -76,7 +112,8 @@ Your responses should be:
                 
                 if api_key:
                     genai.configure(api_key=api_key)
-                    self.model = genai.GenerativeModel('gemini-pro')
+                    self._genai = genai
+                    self.model = self._create_model()
                     self.chat_session = self.model.start_chat(history=[])
                     self.use_gemini = True
                 else:
@@ -86,6 +123,13 @@ Your responses should be:
                 print("Warning: google-generativeai not installed. Using fallback responses.")
                 self.use_gemini = False
     
+    def _create_model(self):
+        """
+        Build the Gemini model with system_context as its system instruction,
+        so it is not repeated in every chat turn.
+        """
+        return self._genai.GenerativeModel(GEMINI_MODEL, system_instruction=self.system_context)
+    
     def get_data_context(self, predictions_df: Optional[pd.DataFrame] = None) -> str:
         """
         Generate context string from current prediction data.
@@ -100,33 +144,36 @@ Your responses should be:
             return "No prediction data currently available."
         
         context_parts = []
+        cols = set(predictions_df.columns)
         
         # Basic stats
         total_customers = len(predictions_df)
         context_parts.append(f"Total customers analyzed: {total_customers}")
         
         # Churn predictions
-        if 'churn_prediction' in predictions_df.columns:
+        if 'churn_prediction' in cols:
             churned = predictions_df['churn_prediction'].sum()
             churn_rate = (churned / total_customers) * 100
             context_parts.append(f"Predicted churners: {churned} ({churn_rate:.1f}%)")
         
         # Risk levels
-        if 'churn_probability' in predictions_df.columns:
-            high_risk = len(predictions_df[predictions_df['churn_probability'] > 0.7])
-            medium_risk = len(predictions_df[(predictions_df['churn_probability'] >= 0.4) & 
-                                            (predictions_df['churn_probability'] <= 0.7)])
-            low_risk = len(predictions_df[predictions_df['churn_probability'] < 0.4])
+        if 'churn_probability' in cols:
+            # One binary-search pass assigns every probability to its bucket
+            probs = predictions_df['churn_probability'].to_numpy(dtype=np.float64, na_value=np.nan)
+            probs = probs[~np.isnan(probs)]
+            low_risk, medium_risk, high_risk = np.bincount(
+                np.searchsorted(RISK_LEVEL_EDGES, probs, side='right'), minlength=3
+            ).tolist()
             context_parts.append(f"Risk levels - High: {high_risk}, Medium: {medium_risk}, Low: {low_risk}")
         
         # Plan distribution
-        if 'plan_tier' in predictions_df.columns:
-            plan_counts = predictions_df['plan_tier'].value_counts().to_dict()
-            plan_str = ", ".join([f"{k}: {v}" for k, v in plan_counts.items()])
+        if 'plan_tier' in cols:
+            plan_counts = predictions_df['plan_tier'].value_counts()
+            plan_str = ", ".join(f"{k}: {v}" for k, v in plan_counts.items())
             context_parts.append(f"Plan distribution - {plan_str}")
         
         # Revenue impact
-        if 'mrr_amount' in predictions_df.columns and 'churn_prediction' in predictions_df.columns:
+        if {'mrr_amount', 'churn_prediction'} <= cols:
             at_risk_mrr = predictions_df[predictions_df['churn_prediction'] == 1]['mrr_amount'].sum()
             context_parts.append(f"At-risk MRR: ${at_risk_mrr:,.2f}")
         
@@ -135,7 +182,8 @@ Your responses should be:
     def generate_response(self, 
                          user_message: str, 
                          predictions_df: Optional[pd.DataFrame] = None,
-                         conversation_history: Optional[List[Dict]] = None) -> str:
+                         conversation_history: Optional[List[Dict]] = None,
+                         stream: bool = False) -> Union[str, Iterator[str]]:
         """
         Generate chatbot response to user message.
         
@@ -143,28 +191,39 @@ Your responses should be:
             user_message: User's question or message
             predictions_df: Current prediction data for context
             conversation_history: Previous messages for context
+            stream: Return an iterator of text chunks (e.g. for st.write_stream) instead of a string
             
         Returns:
-            Chatbot response string
+            Chatbot response string, or an iterator over its chunks when stream is True
         """
         if self.use_gemini and self.model:
-            return self._generate_gemini_response(user_message, predictions_df, conversation_history)
-        else:
-            return self._generate_fallback_response(user_message, predictions_df)
+            if stream:
+                return self._stream_gemini_response(user_message, predictions_df, conversation_history)
+            return "".join(self._stream_gemini_response(user_message, predictions_df, conversation_history,
+                                                        stream=False))
+        response = self._generate_fallback_response(user_message, predictions_df)
+        return iter((response,)) if stream else response
     
-    def _generate_gemini_response(self, 
-                                  user_message: str,
-                                  predictions_df: Optional[pd.DataFrame],
-                                  conversation_history: Optional[List[Dict]]) -> str:
+    def _stream_gemini_response(self, 
+                                user_message: str,
+                                predictions_df: Optional[pd.DataFrame],
+                                conversation_history: Optional[List[Dict]],
+                                stream: bool = True) -> Iterator[str]:
         """
-        Generate response using Google Gemini API.
+        Generate response using Google Gemini API, yielding text as it arrives.
+        
+        Cached answers are yielded whole; with stream=False the reply is requested in one piece.
+        Only opening questions (no assistant turn in conversation_history yet) use the
+        response caches: their answer depends on the data alone, so it is safe to share
+        between the conversations served by this instance.
         """
         # Build context-aware prompt
         data_context = self.get_data_context(predictions_df)
+        data_hash = hashlib.md5(data_context.encode()).hexdigest()
+        cache_key = hashlib.sha256(f"{user_message.strip().lower()}|{data_hash}".encode()).hexdigest()
+        cacheable = not any(message.get("role") == "assistant" for message in conversation_history or ())
         
         full_prompt = f"""
-{self.system_context}
-
 CURRENT DATA CONTEXT:
 {data_context}
 
@@ -173,11 +232,84 @@ USER QUESTION: {user_message}
 Please provide a helpful, concise response based on the system capabilities and current data.
 """
         
+        query_vector = None
+        if cacheable:
+            # Exact repeat of a question over the same data
+            with self._cache_lock:
+                cached = self._exact_cache.get(cache_key)
+                if cached is not None:
+                    self._exact_cache.move_to_end(cache_key)
+            
+            # Paraphrase of a question already answered over the same data
+            if cached is None:
+                query_vector = self._embed(user_message)
+                if query_vector is not None:
+                    with self._cache_lock:
+                        cached = self._semantic_lookup(query_vector, data_hash)
+            
+            if cached is not None:
+                self._record_turn(full_prompt, cached)
+                yield cached
+                return
+        
+        chunks = []
         try:
-            response = self.chat_session.send_message(full_prompt)
-            return response.text
+            response = self.chat_session.send_message(full_prompt, stream=stream)
+            for chunk in response:
+                chunks.append(chunk.text)
+                yield chunk.text
         except Exception as e:
-            return f"I encountered an error processing your request: {str(e)}. Please try rephrasing your question."
+            yield f"I encountered an error processing your request: {str(e)}. Please try rephrasing your question."
+            return
+        
+        if cacheable:
+            self._store_response(cache_key, data_hash, query_vector, "".join(chunks))
+    
+    def _record_turn(self, prompt: str, response_text: str):
+        """Add a turn answered from the cache to the chat session, so follow-ups see it."""
+        self.chat_session.history = [
+            *self.chat_session.history,
+            {"role": "user", "parts": [prompt]},
+            {"role": "model", "parts": [response_text]},
+        ]
+    
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Unit-length Gemini embedding of text, or None if the embedding call fails."""
+        try:
+            result = self._genai.embed_content(model=EMBEDDING_MODEL, content=text)
+        except Exception:
+            return None
+        vector = np.asarray(result["embedding"], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+    
+    def _semantic_lookup(self, query_vector: np.ndarray, data_hash: str) -> Optional[str]:
+        """Cached response whose question is most similar to query_vector, if above the threshold."""
+        if data_hash != self._sem_data_hash or not self._sem_responses:
+            return None
+        similarities = self._sem_vectors @ query_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] > SEMANTIC_CACHE_THRESHOLD:
+            return self._sem_responses[best]
+        return None
+    
+    def _store_response(self, cache_key: str, data_hash: str,
+                        query_vector: Optional[np.ndarray], response_text: str):
+        """Record a fresh Gemini response in the exact and semantic caches."""
+        with self._cache_lock:
+            self._exact_cache[cache_key] = response_text
+            if len(self._exact_cache) > RESPONSE_CACHE_SIZE:
+                self._exact_cache.popitem(last=False)
+            
+            if query_vector is None:
+                return
+            # Semantic entries only ever match the current data context
+            if data_hash != self._sem_data_hash:
+                self._sem_data_hash = data_hash
+                self._sem_vectors = np.empty((0, query_vector.shape[0]), dtype=np.float32)
+                self._sem_responses = []
+            self._sem_vectors = np.vstack([self._sem_vectors, query_vector])[-RESPONSE_CACHE_SIZE:]
+            self._sem_responses = (self._sem_responses + [response_text])[-RESPONSE_CACHE_SIZE:]
     
     def _generate_fallback_response(self, 
                                     user_message: str,
@@ -187,8 +319,19 @@ Please provide a helpful, concise response based on the system capabilities and
         """
         message_lower = user_message.lower()
         
+        # Pull the columns the branches below need into ndarrays once
+        has_data = predictions_df is not None and not predictions_df.empty
+        probs = preds = mrr = None
+        if has_data:
+            if 'churn_probability' in predictions_df.columns:
+                probs = predictions_df['churn_probability'].to_numpy(dtype=np.float64, na_value=np.nan)
+            if 'churn_prediction' in predictions_df.columns:
+                preds = predictions_df['churn_prediction'].to_numpy(dtype=np.float64, na_value=np.nan)
+            if 'mrr_amount' in predictions_df.columns:
+                mrr = predictions_df['mrr_amount'].to_numpy(dtype=np.float64, na_value=np.nan)
+        
         # Greeting
-        if any(word in message_lower for word in ['hello', 'hi', 'hey', 'greetings']):
+        if _GREETING_PATTERN.search(message_lower):
             return """Hello! I'm your AI assistant for the Churn Prediction System. I can help you with:
 
 - Understanding churn predictions and risk levels
@@ -201,13 +344,13 @@ What would you like to know?"""
         
         # Churn-related questions
         if 'churn' in message_lower:
-            if predictions_df is not None and not predictions_df.empty:
-                if 'churn_probability' in predictions_df.columns:
-                    high_risk = len(predictions_df[predictions_df['churn_probability'] > 0.7])
-                    avg_prob = predictions_df['churn_probability'].mean()
+            if has_data:
+                if probs is not None:
+                    high_risk = int(np.count_nonzero(probs > 0.7))
+                    avg_prob = np.nanmean(probs)
                     
                     if 'most likely' in message_lower or 'highest' in message_lower:
-                        top_customer = predictions_df.nlargest(1, 'churn_probability').iloc[0]
+                        top_customer = predictions_df.iloc[int(np.argmax(np.nan_to_num(probs, nan=-np.inf)))]
                         return f"""Based on current predictions, customer **{top_customer.get('customer_id', 'N/A')}** has the highest churn risk:
 
 - Churn Probability: {top_customer['churn_probability']:.1%}
@@ -240,7 +383,7 @@ You can explore detailed predictions in the "Make Predictions" section or ask sp
 Once you have predictions, I can provide detailed churn analysis and recommendations."""
         
         # Model/SHAP questions
-        if any(word in message_lower for word in ['model', 'shap', 'explain', 'how does', 'feature']):
+        if _MODEL_PATTERN.search(message_lower):
             return """The churn prediction system uses a **RandomForest Classifier** with the following characteristics:
 
 **Model Details:**
@@ -265,16 +408,17 @@ Every prediction includes SHAP (SHapley Additive exPlanations) values that show:
 View SHAP explanations in the prediction results for detailed breakdowns."""
         
         # High-risk customers
-        if 'high risk' in message_lower or 'at risk' in message_lower:
-            if predictions_df is not None and not predictions_df.empty and 'churn_probability' in predictions_df.columns:
-                high_risk_df = predictions_df[predictions_df['churn_probability'] > 0.7]
+        if _RISK_PATTERN.search(message_lower):
+            if probs is not None:
+                high_risk_mask = probs > 0.7
+                high_risk_count = int(np.count_nonzero(high_risk_mask))
                 
-                if len(high_risk_df) > 0:
-                    mrr_at_risk = high_risk_df['mrr_amount'].sum() if 'mrr_amount' in high_risk_df.columns else 0
+                if high_risk_count > 0:
+                    mrr_at_risk = float(np.nansum(mrr[high_risk_mask])) if mrr is not None else 0
                     
                     return f"""**High-Risk Customer Alert**
 
-Found {len(high_risk_df)} customers with >70% churn probability:
+Found {high_risk_count} customers with >70% churn probability:
 
 - **At-risk MRR**: ${mrr_at_risk:,.2f}/month
 - **At-risk ARR**: ${mrr_at_risk * 12:,.2f}/year
@@ -292,14 +436,14 @@ View the full list in "Augmented Analytics" by asking "Show me high-risk custome
                 return "Please run predictions first to identify high-risk customers."
         
         # Revenue questions
-        if any(word in message_lower for word in ['revenue', 'mrr', 'arr', 'money']):
-            if predictions_df is not None and not predictions_df.empty:
-                if 'mrr_amount' in predictions_df.columns:
-                    total_mrr = predictions_df['mrr_amount'].sum()
+        if _REVENUE_PATTERN.search(message_lower):
+            if has_data:
+                if mrr is not None:
+                    total_mrr = float(np.nansum(mrr))
                     total_arr = total_mrr * 12
                     
-                    if 'churn_prediction' in predictions_df.columns:
-                        at_risk_mrr = predictions_df[predictions_df['churn_prediction'] == 1]['mrr_amount'].sum()
+                    if preds is not None:
+                        at_risk_mrr = float(np.nansum(mrr[preds == 1]))
                         at_risk_arr = at_risk_mrr * 12
                         
                         return f"""**Revenue Analysis:**
@@ -315,7 +459,7 @@ View the full list in "Augmented Analytics" by asking "Show me high-risk custome
 **Recommendation:** Focus retention efforts on high-value at-risk customers to protect revenue. Use the NL-to-SQL interface to query "Show customers with MRR over $1000 at high churn risk" """
         
         # Data query help
-        if any(word in message_lower for word in ['query', 'sql', 'search', 'find', 'show me']):
+        if _QUERY_PATTERN.search(message_lower):
             return """You can query the data in two ways:
 
 **1. Augmented Analytics (Pre-built Queries):**
@@ -339,7 +483,7 @@ The system will automatically:
 - Allow CSV export"""
         
         # General help
-        if any(word in message_lower for word in ['help', 'what can you', 'capabilities', 'features']):
+        if _HELP_PATTERN.search(message_lower):
             return """I can assist you with:
 
 **Churn Predictions:**
@@ -381,6 +525,11 @@ I can help you with churn predictions, model insights, customer analytics, and d
 What would you like to know?"""
     
     def reset_conversation(self):
-        """Reset the chat session."""
+        """
+        Reset the chat session.
+        
+        Cached opening answers are kept: they do not depend on any conversation and
+        are shared with the other sessions using this chatbot.
+        """
         if self.use_gemini and self.model:
             self.chat_session = self.model.start_chat(history=[])
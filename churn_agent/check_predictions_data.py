@@ -26,8 +26,7 @@ def check_predictions_data():
         # Count rows
         print(f"\n2. Counting rows...")
         count_query = f"SELECT COUNT(*) as count FROM `{table_ref}`"
-        result = client.query(count_query).to_dataframe()
-        row_count = result['count'].iloc[0]
+        row_count = next(iter(client.query(count_query).result())).count
         print(f"   Row count: {row_count}")
         
         if row_count == 0:
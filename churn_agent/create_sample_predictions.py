@@ -1,10 +1,10 @@
 """
 Create sample predictions and store them in BigQuery
 """
+import numpy as np
 import pandas as pd
 from google.cloud import bigquery
-from datetime import datetime
-import uuid
+from data_handler import store_predictions
 
 PROJECT_ID = "hackathon-475722"
 DATASET_ID = "churn_predictions_dataset"
@@ -20,31 +20,21 @@ def create_sample_predictions():
     # Create sample predictions
     print("\n1. Generating sample predictions...")
     
-    # Generate realistic sample data
-    sample_data = []
-    for i in range(50):
-        customer_id = f"CUST_{i+1:04d}"
-        # Mix of low, medium, high risk customers
-        if i < 20:
-            churn_prob = 0.2 + (i * 0.01)  # Low risk
-        elif i < 35:
-            churn_prob = 0.4 + (i * 0.01)  # Medium risk
-        else:
-            churn_prob = 0.7 + (i * 0.01)  # High risk
-        
-        churn_prediction = churn_prob > 0.5
-        
-        sample_data.append({
-            'customer_id': customer_id,
-            'churn_prediction': churn_prediction,
-            'churn_probability': churn_prob
-        })
+    # Generate realistic sample data: a mix of low, medium and high risk customers
+    idx = np.arange(50)
+    churn_prob = np.where(idx < 20, 0.2 + idx * 0.01,       # Low risk
+                 np.where(idx < 35, 0.4 + idx * 0.01,       # Medium risk
+                          0.7 + idx * 0.01))                # High risk
     
-    predictions_df = pd.DataFrame(sample_data)
+    predictions_df = pd.DataFrame({
+        'customer_id': [f"CUST_{i + 1:04d}" for i in idx],
+        'churn_prediction': churn_prob > 0.5,
+        'churn_probability': churn_prob
+    })
     print(f"   ✓ Generated {len(predictions_df)} sample predictions")
-    print(f"   → Low risk (< 0.4): {len(predictions_df[predictions_df['churn_probability'] < 0.4])}")
-    print(f"   → Medium risk (0.4-0.7): {len(predictions_df[(predictions_df['churn_probability'] >= 0.4) & (predictions_df['churn_probability'] < 0.7)])}")
-    print(f"   → High risk (>= 0.7): {len(predictions_df[predictions_df['churn_probability'] >= 0.7])}")
+    print(f"   → Low risk (< 0.4): {np.count_nonzero(churn_prob < 0.4)}")
+    print(f"   → Medium risk (0.4-0.7): {np.count_nonzero((churn_prob >= 0.4) & (churn_prob < 0.7))}")
+    print(f"   → High risk (>= 0.7): {np.count_nonzero(churn_prob >= 0.7)}")
     
     # Store in BigQuery
     print(f"\n2. Storing predictions in BigQuery...")
@@ -52,16 +42,8 @@ def create_sample_predictions():
         client = bigquery.Client(project=PROJECT_ID)
         table_ref = f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"
         
-        job_config = bigquery.LoadJobConfig(
-            write_disposition="WRITE_APPEND"
-        )
-        
-        job = client.load_table_from_dataframe(
-            predictions_df, 
-            table_ref, 
-            job_config=job_config
-        )
-        job.result()  # Wait for completion
+        # One load job, which also creates the table on first use and clears stale local caches
+        store_predictions(PROJECT_ID, DATASET_ID, TABLE_ID, predictions_df, client=client)
         
         print(f"   ✓ Stored {len(predictions_df)} predictions to BigQuery")
         print(f"   → Table: {table_ref}")
@@ -74,8 +56,7 @@ def create_sample_predictions():
     print(f"\n3. Verifying data...")
     try:
         count_query = f"SELECT COUNT(*) as count FROM `{table_ref}`"
-        result = client.query(count_query).to_dataframe()
-        row_count = result['count'].iloc[0]
+        row_count = next(iter(client.query(count_query).result())).count
         print(f"   ✓ Table now has {row_count} rows")
     except Exception as e:
         print(f"   ✗ Error verifying: {e}")
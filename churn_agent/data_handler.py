@@ -1,9 +1,84 @@
+import numpy as np
 import pandas as pd
 from google.cloud import bigquery
 import os
-from typing import Optional
+import glob
+import hashlib
+from functools import lru_cache
+from typing import List, Optional
 
-def get_churn_data(project_id: str, dataset_id: str, table_id: str) -> pd.DataFrame:
+try:
+    from google.cloud import bigquery_storage
+except ImportError:  # reads fall back to the REST tabledata path
+    bigquery_storage = None
+
+__all__ = ['get_churn_data', 'get_subscription_data', 'store_predictions']
+
+# Local Parquet cache of BigQuery reads, one file per table and column projection.
+# A file is stamped with the table's last-modified time and served only while the
+# table still reports that time, so writes from other instances are picked up.
+CACHE_DIR = './data'
+# CSV snapshot shipped with the repo, used only when BigQuery and the Parquet cache are unavailable
+SEED_CACHE_PATH = './data/predictions_cache.csv'
+
+@lru_cache(maxsize=8)
+def _client(project_id: str) -> bigquery.Client:
+    """Shared BigQuery client per project, so credential discovery runs once per process."""
+    return bigquery.Client(project=project_id)
+
+@lru_cache(maxsize=1)
+def _read_client():
+    """Shared BigQuery Storage Read API client (Arrow streams), or None when the library is missing."""
+    if bigquery_storage is None:
+        return None
+    return bigquery_storage.BigQueryReadClient()
+
+def _select_list(table: bigquery.Table, columns: Optional[List[str]]) -> str:
+    """
+    SELECT list projecting the requested columns that exist in the table, or * when none are requested.
+
+    Projection cuts scanned (billed) and transferred bytes; checking the schema keeps
+    tables that lack some optional feature columns working as they did with SELECT *.
+    """
+    if not columns:
+        return '*'
+    available = {field.name for field in table.schema}
+    return ', '.join(f'`{column}`' for column in columns if column in available) or '*'
+
+def _cache_path(dataset_id: str, table_id: str, columns: Optional[List[str]] = None) -> str:
+    """Parquet cache file for a table, or for one column projection of it."""
+    if not columns:
+        return os.path.join(CACHE_DIR, f"{dataset_id}.{table_id}.parquet")
+    projection = hashlib.sha1(','.join(columns).encode()).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"{dataset_id}.{table_id}.{projection}.parquet")
+
+def _cache_files(dataset_id: str, table_id: str) -> List[str]:
+    """Every existing Parquet cache file of a table: the full read and each column projection."""
+    full = _cache_path(dataset_id, table_id)
+    projections = glob.escape(os.path.join(CACHE_DIR, f"{dataset_id}.{table_id}.")) + '?' * 12 + '.parquet'
+    return ([full] if os.path.exists(full) else []) + glob.glob(projections)
+
+def _table_stamp(table: bigquery.Table) -> Optional[int]:
+    """The table's last-modified time in nanoseconds, used as the cache file's mtime."""
+    if table.modified is None:
+        return None
+    return round(table.modified.timestamp() * 1000) * 1_000_000
+
+def _cache_matches(path: str, stamp: Optional[int]) -> bool:
+    """Whether the cache file was written from the table version with this stamp."""
+    return stamp is not None and os.path.exists(path) and os.stat(path).st_mtime_ns == stamp
+
+def _read_cache(path: str, arrow_dtypes: bool) -> pd.DataFrame:
+    """Load a cached table, keeping Arrow-backed columns when requested."""
+    if arrow_dtypes:
+        return pd.read_parquet(path, dtype_backend='pyarrow')
+    return pd.read_parquet(path)
+
+def get_churn_data(project_id: str, dataset_id: str, table_id: str,
+                   arrow_dtypes: bool = False,
+                   client: Optional[bigquery.Client] = None,
+                   columns: Optional[List[str]] = None,
+                   table: Optional[bigquery.Table] = None) -> pd.DataFrame:
     """
     Fetch churn data from BigQuery with fallback to local cache.
     
@@ -11,64 +86,113 @@ def get_churn_data(project_id: str, dataset_id: str, table_id: str) -> pd.DataFr
         project_id: GCP project ID
         dataset_id: BigQuery dataset ID
         table_id: BigQuery table ID
+        arrow_dtypes: Return Arrow-backed columns (pd.ArrowDtype) so display code
+            such as st.dataframe can serialize them without a pandas->Arrow pass
+        client: BigQuery client to use; defaults to the shared per-project client
+        columns: Columns to read (e.g. model_trainer.TRAINING_COLUMNS); all columns when omitted
+        table: Table metadata the caller already fetched (e.g. to key its own cache);
+            validates the local cache against the same version without another call
         
     Returns:
         DataFrame with churn data
     """
-    # Check for local cache first
-    local_cache_path = './data/predictions_cache.csv'
-    
+    local_cache_path = _cache_path(dataset_id, table_id, columns)
     try:
-        # Try BigQuery first
-        client = bigquery.Client(project=project_id)
-        query = f"SELECT * FROM `{project_id}.{dataset_id}.{table_id}` LIMIT 1000"
-        df = client.query(query).to_dataframe()
+        # Try BigQuery first; one metadata call tells whether the local cache is current
+        client = client or _client(project_id)
+        table_ref = f"{project_id}.{dataset_id}.{table_id}"
+        table = table or client.get_table(table_ref)
+        stamp = _table_stamp(table)
+        if _cache_matches(local_cache_path, stamp):
+            return _read_cache(local_cache_path, arrow_dtypes)
+        
+        query = f"SELECT {_select_list(table, columns)} FROM `{table_ref}` LIMIT 1000"
+        # query_and_wait uses the jobs.query fast path, so small results come back
+        # without separate jobs.get polling. Larger results stream as Arrow through
+        # the Storage API; the client skips it when the first page holds every row.
+        rows = client.query_and_wait(query)
+        read_client = _read_client()
+        if arrow_dtypes:
+            df = rows.to_arrow(bqstorage_client=read_client, create_bqstorage_client=False).to_pandas(types_mapper=pd.ArrowDtype)
+        else:
+            df = rows.to_dataframe(bqstorage_client=read_client, create_bqstorage_client=False)
         
-        # Save to cache for future use
-        os.makedirs('./data', exist_ok=True)
-        df.to_csv(local_cache_path, index=False)
+        # Save to cache for future use (typed and columnar, no text round-trip)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(local_cache_path, compression='snappy', engine='pyarrow', index=False)
+        if stamp is not None:
+            os.utime(local_cache_path, ns=(stamp, stamp))
         return df
         
     except Exception as e:
-        # Fall back to local cache
+        # Fall back to local cache, however old
         if os.path.exists(local_cache_path):
             print(f"Using local cache due to BigQuery error: {e}")
-            return pd.read_csv(local_cache_path)
+            return _read_cache(local_cache_path, arrow_dtypes)
+        elif os.path.exists(SEED_CACHE_PATH):
+            print(f"Using bundled snapshot due to BigQuery error: {e}")
+            if arrow_dtypes:
+                return pd.read_csv(SEED_CACHE_PATH, dtype_backend='pyarrow')
+            return pd.read_csv(SEED_CACHE_PATH)
         else:
             # Return sample data for demo
             print("No BigQuery access and no local cache. Using sample data.")
             return _get_sample_predictions()
 
-def _get_sample_predictions() -> pd.DataFrame:
-    """Generate sample prediction data for demo purposes."""
-    import numpy as np
-    np.random.seed(42)
+@lru_cache(maxsize=1)
+def _sample_predictions() -> pd.DataFrame:
+    """Build the demo frame once; a private seeded RandomState leaves the global NumPy RNG untouched."""
+    rng = np.random.RandomState(42)
     n_samples = 50
     
     return pd.DataFrame({
         'customer_id': [f'C{i:05d}' for i in range(n_samples)],
-        'churn_prediction': np.random.choice([0, 1], n_samples, p=[0.7, 0.3]),
-        'churn_probability': np.random.beta(2, 5, n_samples),
-        'plan_tier': np.random.choice(['basic', 'standard', 'premium'], n_samples),
-        'is_trial': np.random.choice([0, 1], n_samples, p=[0.8, 0.2]),
-        'auto_renew_flag': np.random.choice([0, 1], n_samples, p=[0.3, 0.7]),
-        'mrr_amount': np.random.uniform(10, 500, n_samples),
-        'seats': np.random.randint(1, 20, n_samples),
-        'billing_frequency': np.random.choice(['monthly', 'annual'], n_samples)
+        'churn_prediction': rng.choice([0, 1], n_samples, p=[0.7, 0.3]),
+        'churn_probability': rng.beta(2, 5, n_samples),
+        'plan_tier': rng.choice(['basic', 'standard', 'premium'], n_samples),
+        'is_trial': rng.choice([0, 1], n_samples, p=[0.8, 0.2]),
+        'auto_renew_flag': rng.choice([0, 1], n_samples, p=[0.3, 0.7]),
+        'mrr_amount': rng.uniform(10, 500, n_samples),
+        'seats': rng.randint(1, 20, n_samples),
+        'billing_frequency': rng.choice(['monthly', 'annual'], n_samples)
     })
 
-def get_subscription_data(project_id: str, dataset_id: str, table_id: str) -> pd.DataFrame:
-    """Fetches subscription data from BigQuery."""
-    client = bigquery.Client(project=project_id)
-    query = f"SELECT * FROM `{project_id}.{dataset_id}.{table_id}`"
-    df = client.query(query).to_dataframe()
+def _get_sample_predictions() -> pd.DataFrame:
+    """Generate sample prediction data for demo purposes."""
+    return _sample_predictions().copy()
+
+def get_subscription_data(project_id: str, dataset_id: str, table_id: str,
+                          client: Optional[bigquery.Client] = None,
+                          columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Fetches subscription data from BigQuery (the full table, or the given columns) through the Storage API."""
+    client = client or _client(project_id)
+    table_ref = f"{project_id}.{dataset_id}.{table_id}"
+    select = _select_list(client.get_table(table_ref), columns) if columns else '*'
+    query = f"SELECT {select} FROM `{table_ref}`"
+    df = client.query_and_wait(query).to_dataframe(bqstorage_client=_read_client(), create_bqstorage_client=False)
     return df
 
-def store_predictions(project_id: str, dataset_id: str, table_id: str, predictions_df: pd.DataFrame):
-    """Stores churn predictions in BigQuery."""
-    client = bigquery.Client(project=project_id)
+def store_predictions(project_id: str, dataset_id: str, table_id: str, predictions_df: pd.DataFrame,
+                      client: Optional[bigquery.Client] = None):
+    """
+    Stores churn predictions in BigQuery.
+
+    The whole frame goes up as one Parquet load job. A load job is atomic (a failed
+    store writes nothing, so retrying cannot duplicate rows) and, unlike streaming
+    inserts, always advances the table's last-modified time that the Parquet caches
+    are validated against. Load jobs have no per-request row limit, and each job
+    counts against the table's daily load quota, so the frame is not split into chunks.
+    """
+    client = client or _client(project_id)
     table_ref = client.dataset(dataset_id).table(table_id)
-    job_config = bigquery.LoadJobConfig(write_disposition="WRITE_APPEND")
+    job_config = bigquery.LoadJobConfig(
+        write_disposition="WRITE_APPEND",
+        source_format=bigquery.SourceFormat.PARQUET
+    )
     job = client.load_table_from_dataframe(predictions_df, table_ref, job_config=job_config)
     job.result()
+
+    # No cached copy of this table, full or projected, reflects BigQuery any more
+    for local_cache_path in _cache_files(dataset_id, table_id):
+        os.remove(local_cache_path)
     print(f"Stored {len(predictions_df)} predictions to {project_id}.{dataset_id}.{table_id}")
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
@@ -11,6 +12,10 @@ import os
 NUMERIC_FEATURES = ['seats', 'mrr_amount', 'arr_amount']
 CATEGORICAL_FEATURES = ['plan_tier', 'is_trial', 'upgrade_flag', 'downgrade_flag', 'billing_frequency', 'auto_renew_flag']
 TARGET_FEATURE = 'churn_flag'
+# Columns train_model reads; used to project BigQuery training queries
+TRAINING_COLUMNS = NUMERIC_FEATURES + CATEGORICAL_FEATURES + [TARGET_FEATURE]
+# Transformed training rows saved with the model as the SHAP background distribution
+BACKGROUND_SAMPLE_ROWS = 100
 
 def train_model(data: pd.DataFrame, model_path: str = 'churn_model.joblib'):
     """Trains a logistic regression model and saves it."""
@@ -26,23 +31,31 @@ def train_model(data: pd.DataFrame, model_path: str = 'churn_model.joblib'):
     actual_numeric_features = [f for f in NUMERIC_FEATURES if f in X.columns]
     actual_categorical_features = [f for f in CATEGORICAL_FEATURES if f in X.columns]
 
+    # Narrow dtypes before fitting: float32 numerics halve the bytes moved through the
+    # scaler and solver, and categoricals are encoded from compact integer codes
+    X = X.astype({f: np.float32 for f in actual_numeric_features})
+    X = X.astype({f: 'category' for f in actual_categorical_features})
+
     preprocessor = ColumnTransformer(
         transformers=[
             ('num', StandardScaler(), actual_numeric_features),
-            ('cat', OneHotEncoder(handle_unknown='ignore'), actual_categorical_features)
+            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False, dtype=np.float32), actual_categorical_features)
         ],
-        remainder='drop'  # Explicitly drop other columns
+        remainder='drop',  # Explicitly drop other columns
+        sparse_threshold=0  # a handful of low-cardinality categoricals: dense is smaller than CSR
     )
 
     model = Pipeline(steps=[
         ('preprocessor', preprocessor),
-        ('classifier', LogisticRegression(solver='liblinear', max_iter=1000))
+        # lbfgs works on the dense float32 matrix as is
+        ('classifier', LogisticRegression(solver='lbfgs', max_iter=1000))
     ])
 
     model.fit(X, y)
     
-    # Save with protocol 5 for better compatibility
-    joblib.dump(model, model_path, compress=3)
+    # Save uncompressed with protocol 5 so predictors can memory-map the fitted arrays
+    # (ChurnPredictor loads with mmap_mode='r'; worker processes then share the pages)
+    joblib.dump(model, model_path, compress=0, protocol=5)
     
     # Also save feature names for reference
     feature_names_path = model_path.replace('.joblib', '_features.joblib')
@@ -51,8 +64,19 @@ def train_model(data: pd.DataFrame, model_path: str = 'churn_model.joblib'):
         'categorical_features': actual_categorical_features
     }, feature_names_path)
     
+    # Background sample for SHAP, so explanations are relative to the training population
+    background_path = model_path.replace('.joblib', '_background.joblib')
+    background = model.named_steps['preprocessor'].transform(
+        X.sample(n=min(BACKGROUND_SAMPLE_ROWS, len(X)), random_state=42)
+    )
+    if hasattr(background, "toarray"):
+        background = background.toarray()
+    joblib.dump(np.ascontiguousarray(background, dtype=np.float32), background_path,
+                compress=0, protocol=5)
+    
     print(f"Model trained and saved to {model_path}")
     print(f"Feature names saved to {feature_names_path}")
+    print(f"SHAP background saved to {background_path}")
     
     return model
 
@@ -62,18 +86,20 @@ if __name__ == '__main__':
     # This is a placeholder for demonstration. In a real scenario, you'd fetch data from BigQuery.
     # For now, let's create some dummy data.
     print("Creating dummy training data...")
-    dummy_data = pd.DataFrame({
-        'seats': [5, 10, 1, 20, 15] * 20,
-        'mrr_amount': [50, 100, 10, 200, 150] * 20,
-        'arr_amount': [600, 1200, 120, 2400, 1800] * 20,
-        'plan_tier': ['basic', 'premium', 'basic', 'standard', 'premium'] * 20,
-        'is_trial': [0, 0, 1, 0, 0] * 20,
-        'upgrade_flag': [0, 1, 0, 0, 1] * 20,
-        'downgrade_flag': [0, 0, 0, 1, 0] * 20,
-        'billing_frequency': ['monthly', 'annual', 'monthly', 'annual', 'monthly'] * 20,
-        'auto_renew_flag': [1, 1, 0, 1, 1] * 20,
-        'churn_flag': [0, 1, 0, 1, 0] * 20
+    # Five prototype customers, tiled to 100 rows
+    prototypes = pd.DataFrame({
+        'seats': [5, 10, 1, 20, 15],
+        'mrr_amount': [50, 100, 10, 200, 150],
+        'arr_amount': [600, 1200, 120, 2400, 1800],
+        'plan_tier': ['basic', 'premium', 'basic', 'standard', 'premium'],
+        'is_trial': [0, 0, 1, 0, 0],
+        'upgrade_flag': [0, 1, 0, 0, 1],
+        'downgrade_flag': [0, 0, 0, 1, 0],
+        'billing_frequency': ['monthly', 'annual', 'monthly', 'annual', 'monthly'],
+        'auto_renew_flag': [1, 1, 0, 1, 1],
+        'churn_flag': [0, 1, 0, 1, 0]
     })
+    dummy_data = prototypes.iloc[np.tile(np.arange(len(prototypes)), 20)].reset_index(drop=True)
     
     print(f"Training model with {len(dummy_data)} samples...")
     model = train_model(dummy_data, model_path='./model/churn_model.joblib')
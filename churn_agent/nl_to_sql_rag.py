@@ -4,12 +4,272 @@ Translates user queries in plain English to BigQuery SQL queries
 """
 
 import re
+import numbers
+from decimal import Decimal
 from typing import Dict, List, Tuple, Optional
 from google.cloud import bigquery
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from functools import lru_cache
+
+try:
+    from google.cloud import bigquery_storage
+except ImportError:  # results are downloaded over the REST tabledata path
+    bigquery_storage = None
+
+
+# SQL query templates with natural language patterns
+QUERY_TEMPLATES = [
+    {
+        "patterns": [
+            "how many customers",
+            "total customers",
+            "count customers",
+            "number of customers",
+            "customer count",
+            "how many accounts"
+        ],
+        "sql_template": "SELECT COUNT(DISTINCT account_id) as total_customers FROM `{table_ref}`",
+        "description": "Count total customers"
+    },
+    {
+        "patterns": [
+            "how many subscriptions",
+            "total subscriptions",
+            "count subscriptions",
+            "number of subscriptions"
+        ],
+        "sql_template": "SELECT COUNT(*) as total_subscriptions FROM `{table_ref}`",
+        "description": "Count total subscriptions"
+    },
+    {
+        "patterns": [
+            "total revenue",
+            "total mrr",
+            "sum of revenue",
+            "revenue total",
+            "monthly recurring revenue"
+        ],
+        "sql_template": "SELECT SUM(mrr_amount) as total_mrr FROM `{table_ref}`",
+        "description": "Calculate total MRR"
+    },
+    {
+        "patterns": [
+            "average revenue",
+            "average mrr",
+            "mean revenue",
+            "avg mrr per customer"
+        ],
+        "sql_template": "SELECT AVG(mrr_amount) as avg_mrr FROM `{table_ref}`",
+        "description": "Calculate average MRR"
+    },
+    {
+        "patterns": [
+            "churned customers",
+            "customers who churned",
+            "cancelled subscriptions",
+            "inactive customers",
+            "lost customers"
+        ],
+        "sql_template": "SELECT * FROM `{table_ref}` WHERE churn_flag = TRUE",
+        "description": "Get churned customers"
+    },
+    {
+        "patterns": [
+            "active customers",
+            "current customers",
+            "active subscriptions",
+            "paying customers"
+        ],
+        "sql_template": "SELECT * FROM `{table_ref}` WHERE churn_flag = FALSE",
+        "description": "Get active customers"
+    },
+    {
+        "patterns": [
+            "high risk customers",
+            "at risk customers",
+            "likely to churn",
+            "churn risk high",
+            "customers at risk"
+        ],
+        "sql_template": "SELECT * FROM `{table_ref}` WHERE churn_flag = FALSE ORDER BY mrr_amount DESC LIMIT 20",
+        "description": "Get potential high-value customers"
+    },
+    {
+        "patterns": [
+            "customers by plan",
+            "subscriptions by plan type",
+            "breakdown by plan",
+            "group by plan"
+        ],
+        "sql_template": "SELECT plan_tier, COUNT(*) as count, SUM(mrr_amount) as total_mrr FROM `{table_ref}` GROUP BY plan_tier ORDER BY total_mrr DESC",
+        "description": "Group customers by plan type"
+    },
+    {
+        "patterns": [
+            "top customers",
+            "highest paying customers",
+            "best customers",
+            "largest revenue customers",
+            "top 10 customers"
+        ],
+        "sql_template": "SELECT account_id, mrr_amount, plan_tier FROM `{table_ref}` ORDER BY mrr_amount DESC LIMIT 10",
+        "description": "Get top customers by revenue"
+    },
+    {
+        "patterns": [
+            "new customers",
+            "recent subscriptions",
+            "customers this month",
+            "latest customers"
+        ],
+        "sql_template": "SELECT * FROM `{table_ref}` WHERE PARSE_DATE('%Y-%m-%d', start_date) >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY) ORDER BY start_date DESC",
+        "description": "Get new customers in last 30 days"
+    },
+    {
+        "patterns": [
+            "customers with tenure",
+            "long term customers",
+            "customer tenure",
+            "how long have customers"
+        ],
+        "sql_template": "SELECT account_id, start_date, mrr_amount FROM `{table_ref}` ORDER BY start_date ASC LIMIT 20",
+        "description": "Get longest tenure customers"
+    },
+    {
+        "patterns": [
+            "churn rate",
+            "percentage churned",
+            "churn percentage",
+            "what is the churn rate"
+        ],
+        "sql_template": """
+            SELECT 
+                COUNT(CASE WHEN churn_flag = TRUE THEN 1 END) as churned_count,
+                COUNT(*) as total_count,
+                ROUND(COUNT(CASE WHEN churn_flag = TRUE THEN 1 END) * 100.0 / COUNT(*), 2) as churn_rate_percent
+            FROM `{table_ref}`
+        """,
+        "description": "Calculate churn rate"
+    },
+    {
+        "patterns": [
+            "revenue by month",
+            "monthly revenue",
+            "mrr by month",
+            "revenue trend"
+        ],
+        "sql_template": """
+            SELECT 
+                SUBSTR(start_date, 1, 7) as month,
+                SUM(mrr_amount) as monthly_revenue,
+                COUNT(*) as subscription_count
+            FROM `{table_ref}`
+            GROUP BY month
+            ORDER BY month DESC
+            LIMIT 12
+        """,
+        "description": "Get monthly revenue trend"
+    },
+    {
+        "patterns": [
+            "show me all",
+            "get all data",
+            "show everything",
+            "list all records"
+        ],
+        "sql_template": "SELECT * FROM `{table_ref}` LIMIT 100",
+        "description": "Get all records (limited to 100)"
+    },
+    {
+        "patterns": [
+            "customers spending more than",
+            "mrr greater than",
+            "revenue above",
+            "customers with high mrr"
+        ],
+        "sql_template": "SELECT * FROM `{table_ref}` WHERE mrr_amount > {amount} ORDER BY mrr_amount DESC",
+        "description": "Get customers with MRR above threshold",
+        "requires_amount": True
+    },
+    {
+        "patterns": [
+            "customers in plan",
+            "subscriptions with plan type",
+            "who has plan",
+            "show me plan"
+        ],
+        "sql_template": "SELECT * FROM `{table_ref}` WHERE LOWER(plan_tier) LIKE '%{plan}%'",
+        "description": "Get customers by plan type",
+        "requires_plan": True
+    }
+]
+
+DEFAULT_COLUMNS = ["subscription_id", "account_id", "start_date", "end_date", "plan_tier",
+                   "seats", "mrr_amount", "arr_amount", "is_trial", "upgrade_flag",
+                   "downgrade_flag", "churn_flag", "billing_frequency", "auto_renew_flag"]
+
+
+@lru_cache(maxsize=8)
+def _client(project_id: str) -> bigquery.Client:
+    """Shared BigQuery client per project."""
+    return bigquery.Client(project=project_id)
+
+
+@lru_cache(maxsize=1)
+def _read_client():
+    """Shared BigQuery Storage Read API client (Arrow streams), or None when the library is missing."""
+    if bigquery_storage is None:
+        return None
+    return bigquery_storage.BigQueryReadClient()
+
+
+@lru_cache(maxsize=32)
+def _table_schema(project_id: str, table_ref: str) -> Tuple[Tuple[str, str], ...]:
+    """(name, type) pairs of a table's fields, fetched once per process; errors are not cached."""
+    table = _client(project_id).get_table(table_ref)
+    return tuple((field.name, field.field_type) for field in table.schema)
+
+
+@lru_cache(maxsize=64)
+def _bind_table(sql_template: str, table_ref: str) -> str:
+    """sql_template with {table_ref} substituted, computed once per template and table."""
+    return sql_template.replace('{table_ref}', table_ref)
+
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+# Entity patterns for _extract_entities: a dollar amount and a whole-word plan name
+_AMOUNT_PATTERN = re.compile(r'\$?(\d+(?:,\d{3})*(?:\.\d{2})?)')
+_PLAN_PATTERN = re.compile(r'\b(basic|premium|enterprise|pro|starter|business|free)\b', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1)
+def _template_index():
+    """TF-IDF vectorizer fitted on every template pattern, the pattern vectors and pattern -> template map."""
+    all_patterns = [pattern for template in QUERY_TEMPLATES for pattern in template["patterns"]]
+    vectorizer = TfidfVectorizer(ngram_range=(1, 3), max_features=500)
+    vectorizer.fit(all_patterns)
+    pattern_vectors = vectorizer.transform(all_patterns)
+    pattern_to_template = [template for template in QUERY_TEMPLATES for _ in template["patterns"]]
+    return vectorizer, pattern_vectors, pattern_to_template
+
+
+@lru_cache(maxsize=1)
+def _pattern_matcher():
+    """
+    One compiled alternation over every template pattern and the template index of each TF-IDF pattern row.
+
+    The alternation sits in a lookahead so overlapping phrases ("active customers with tenure")
+    are all found; at each word the longest pattern wins.
+    """
+    pattern_to_index = {}
+    for idx, template in enumerate(QUERY_TEMPLATES):
+        for pattern in template["patterns"]:
+            pattern_to_index.setdefault(pattern, idx)
+    alternation = "|".join(re.escape(p) for p in sorted(pattern_to_index, key=len, reverse=True))
+    pattern_templates = np.array([idx for idx, template in enumerate(QUERY_TEMPLATES) for _ in template["patterns"]])
+    return re.compile(rf"\b(?=({alternation})\b)"), pattern_to_index, pattern_templates
 
 
 class NLtoSQLRAG:
@@ -19,27 +279,26 @@ class NLtoSQLRAG:
         self.project_id = project_id
         self.dataset_id = dataset_id
         self.table_id = table_id
-        self.client = bigquery.Client(project=project_id)
+        self.client = _client(project_id)
         
         # Initialize schema information
         self.schema_info = self._get_schema_info()
         
         # SQL query templates with natural language patterns
-        self.query_templates = self._initialize_query_templates()
+        self.query_templates = QUERY_TEMPLATES
         
-        # Initialize TF-IDF vectorizer for semantic matching
-        self.vectorizer = TfidfVectorizer(ngram_range=(1, 3), max_features=500)
-        self._train_vectorizer()
+        # TF-IDF vectorizer for semantic matching, fitted once per process
+        self.vectorizer, self.pattern_vectors, self.pattern_to_template = _template_index()
         
     def _get_schema_info(self) -> Dict:
         """Fetch and cache BigQuery table schema"""
+        table_ref = f"{self.project_id}.{self.dataset_id}.{self.table_id}"
         try:
-            table_ref = f"{self.project_id}.{self.dataset_id}.{self.table_id}"
-            table = self.client.get_table(table_ref)
+            fields = _table_schema(self.project_id, table_ref)
             
             schema_info = {
-                "columns": [field.name for field in table.schema],
-                "column_types": {field.name: field.field_type for field in table.schema},
+                "columns": [name for name, _ in fields],
+                "column_types": dict(fields),
                 "table_ref": table_ref
             }
             
@@ -48,242 +307,42 @@ class NLtoSQLRAG:
             print(f"Error fetching schema: {e}")
             # Default schema based on actual table structure
             return {
-                "columns": ["subscription_id", "account_id", "start_date", "end_date", "plan_tier", 
-                           "seats", "mrr_amount", "arr_amount", "is_trial", "upgrade_flag", 
-                           "downgrade_flag", "churn_flag", "billing_frequency", "auto_renew_flag"],
+                "columns": list(DEFAULT_COLUMNS),
                 "column_types": {},
-                "table_ref": f"{self.project_id}.{self.dataset_id}.{self.table_id}"
+                "table_ref": table_ref
             }
     
-    def _initialize_query_templates(self) -> List[Dict]:
-        """Initialize SQL query templates with NL patterns"""
-        templates = [
-            {
-                "patterns": [
-                    "how many customers",
-                    "total customers",
-                    "count customers",
-                    "number of customers",
-                    "customer count",
-                    "how many accounts"
-                ],
-                "sql_template": "SELECT COUNT(DISTINCT account_id) as total_customers FROM `{table_ref}`",
-                "description": "Count total customers"
-            },
-            {
-                "patterns": [
-                    "how many subscriptions",
-                    "total subscriptions",
-                    "count subscriptions",
-                    "number of subscriptions"
-                ],
-                "sql_template": "SELECT COUNT(*) as total_subscriptions FROM `{table_ref}`",
-                "description": "Count total subscriptions"
-            },
-            {
-                "patterns": [
-                    "total revenue",
-                    "total mrr",
-                    "sum of revenue",
-                    "revenue total",
-                    "monthly recurring revenue"
-                ],
-                "sql_template": "SELECT SUM(mrr_amount) as total_mrr FROM `{table_ref}`",
-                "description": "Calculate total MRR"
-            },
-            {
-                "patterns": [
-                    "average revenue",
-                    "average mrr",
-                    "mean revenue",
-                    "avg mrr per customer"
-                ],
-                "sql_template": "SELECT AVG(mrr_amount) as avg_mrr FROM `{table_ref}`",
-                "description": "Calculate average MRR"
-            },
-            {
-                "patterns": [
-                    "churned customers",
-                    "customers who churned",
-                    "cancelled subscriptions",
-                    "inactive customers",
-                    "lost customers"
-                ],
-                "sql_template": "SELECT * FROM `{table_ref}` WHERE churn_flag = TRUE",
-                "description": "Get churned customers"
-            },
-            {
-                "patterns": [
-                    "active customers",
-                    "current customers",
-                    "active subscriptions",
-                    "paying customers"
-                ],
-                "sql_template": "SELECT * FROM `{table_ref}` WHERE churn_flag = FALSE",
-                "description": "Get active customers"
-            },
-            {
-                "patterns": [
-                    "high risk customers",
-                    "at risk customers",
-                    "likely to churn",
-                    "churn risk high",
-                    "customers at risk"
-                ],
-                "sql_template": "SELECT * FROM `{table_ref}` WHERE churn_flag = FALSE ORDER BY mrr_amount DESC LIMIT 20",
-                "description": "Get potential high-value customers"
-            },
-            {
-                "patterns": [
-                    "customers by plan",
-                    "subscriptions by plan type",
-                    "breakdown by plan",
-                    "group by plan"
-                ],
-                "sql_template": "SELECT plan_tier, COUNT(*) as count, SUM(mrr_amount) as total_mrr FROM `{table_ref}` GROUP BY plan_tier ORDER BY total_mrr DESC",
-                "description": "Group customers by plan type"
-            },
-            {
-                "patterns": [
-                    "top customers",
-                    "highest paying customers",
-                    "best customers",
-                    "largest revenue customers",
-                    "top 10 customers"
-                ],
-                "sql_template": "SELECT account_id, mrr_amount, plan_tier FROM `{table_ref}` ORDER BY mrr_amount DESC LIMIT 10",
-                "description": "Get top customers by revenue"
-            },
-            {
-                "patterns": [
-                    "new customers",
-                    "recent subscriptions",
-                    "customers this month",
-                    "latest customers"
-                ],
-                "sql_template": "SELECT * FROM `{table_ref}` WHERE PARSE_DATE('%Y-%m-%d', start_date) >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY) ORDER BY start_date DESC",
-                "description": "Get new customers in last 30 days"
-            },
-            {
-                "patterns": [
-                    "customers with tenure",
-                    "long term customers",
-                    "customer tenure",
-                    "how long have customers"
-                ],
-                "sql_template": "SELECT account_id, start_date, mrr_amount FROM `{table_ref}` ORDER BY start_date ASC LIMIT 20",
-                "description": "Get longest tenure customers"
-            },
-            {
-                "patterns": [
-                    "churn rate",
-                    "percentage churned",
-                    "churn percentage",
-                    "what is the churn rate"
-                ],
-                "sql_template": """
-                    SELECT 
-                        COUNT(CASE WHEN churn_flag = TRUE THEN 1 END) as churned_count,
-                        COUNT(*) as total_count,
-                        ROUND(COUNT(CASE WHEN churn_flag = TRUE THEN 1 END) * 100.0 / COUNT(*), 2) as churn_rate_percent
-                    FROM `{table_ref}`
-                """,
-                "description": "Calculate churn rate"
-            },
-            {
-                "patterns": [
-                    "revenue by month",
-                    "monthly revenue",
-                    "mrr by month",
-                    "revenue trend"
-                ],
-                "sql_template": """
-                    SELECT 
-                        SUBSTR(start_date, 1, 7) as month,
-                        SUM(mrr_amount) as monthly_revenue,
-                        COUNT(*) as subscription_count
-                    FROM `{table_ref}`
-                    GROUP BY month
-                    ORDER BY month DESC
-                    LIMIT 12
-                """,
-                "description": "Get monthly revenue trend"
-            },
-            {
-                "patterns": [
-                    "show me all",
-                    "get all data",
-                    "show everything",
-                    "list all records"
-                ],
-                "sql_template": "SELECT * FROM `{table_ref}` LIMIT 100",
-                "description": "Get all records (limited to 100)"
-            },
-            {
-                "patterns": [
-                    "customers spending more than",
-                    "mrr greater than",
-                    "revenue above",
-                    "customers with high mrr"
-                ],
-                "sql_template": "SELECT * FROM `{table_ref}` WHERE mrr_amount > {amount} ORDER BY mrr_amount DESC",
-                "description": "Get customers with MRR above threshold",
-                "requires_amount": True
-            },
-            {
-                "patterns": [
-                    "customers in plan",
-                    "subscriptions with plan type",
-                    "who has plan",
-                    "show me plan"
-                ],
-                "sql_template": "SELECT * FROM `{table_ref}` WHERE LOWER(plan_tier) LIKE '%{plan}%'",
-                "description": "Get customers by plan type",
-                "requires_plan": True
-            }
-        ]
-        
-        return templates
-    
-    def _train_vectorizer(self):
-        """Train TF-IDF vectorizer on query patterns"""
-        all_patterns = []
-        for template in self.query_templates:
-            all_patterns.extend(template["patterns"])
-        
-        self.vectorizer.fit(all_patterns)
-        self.pattern_vectors = self.vectorizer.transform(all_patterns)
-        
-        # Create mapping from pattern to template
-        self.pattern_to_template = {}
-        idx = 0
-        for template in self.query_templates:
-            for pattern in template["patterns"]:
-                self.pattern_to_template[idx] = template
-                idx += 1
-    
     def _extract_entities(self, query: str) -> Dict:
         """Extract entities from query (amounts, plan types, etc.)"""
         entities = {}
         
         # Extract numeric amounts
-        amount_match = re.search(r'\$?(\d+(?:,\d{3})*(?:\.\d{2})?)', query)
+        amount_match = _AMOUNT_PATTERN.search(query)
         if amount_match:
             entities['amount'] = float(amount_match.group(1).replace(',', ''))
         
         # Extract plan types (common plan names)
-        plan_keywords = ['basic', 'premium', 'enterprise', 'pro', 'starter', 'business', 'free']
-        for keyword in plan_keywords:
-            if keyword in query.lower():
-                entities['plan'] = keyword
-                break
+        plan_match = _PLAN_PATTERN.search(query)
+        if plan_match:
+            entities['plan'] = plan_match.group(1).lower()
         
         return entities
     
     def find_best_template(self, user_query: str) -> Tuple[Optional[Dict], float]:
         """Find the best matching SQL template for user query"""
+        # TF-IDF rows are already L2-normalized (norm='l2'), so cosine similarity is a plain sparse dot
         query_vector = self.vectorizer.transform([user_query.lower()])
-        similarities = cosine_similarity(query_vector, self.pattern_vectors)[0]
+        similarities = (query_vector @ self.pattern_vectors.T).toarray().ravel()
+        
+        # Templates whose patterns appear literally in the query are the only candidates;
+        # TF-IDF still ranks them, so the best-covered phrase wins and confidence is its real score
+        matcher, pattern_to_index, pattern_templates = _pattern_matcher()
+        normalized = _NON_WORD.sub(" ", user_query.lower())
+        candidates = [pattern_to_index[match.group(1)] for match in matcher.finditer(normalized)]
+        if candidates:
+            similarities = np.where(np.isin(pattern_templates, candidates), similarities, -1.0)
+            best_idx = np.argmax(similarities)
+            return self.pattern_to_template[best_idx], float(similarities[best_idx])
         
         best_idx = np.argmax(similarities)
         best_score = similarities[best_idx]
@@ -311,20 +370,24 @@ class NLtoSQLRAG:
         if template.get('requires_plan') and 'plan' not in entities:
             return None, "Please specify a plan type (e.g., 'basic', 'premium', 'enterprise')", {}
         
-        # Generate SQL from template
-        sql_query = template['sql_template'].format(
-            table_ref=self.schema_info['table_ref'],
-            amount=entities.get('amount', 0),
-            plan=entities.get('plan', '')
-        )
+        # Generate SQL from template; only amount/plan templates still have fields to fill
+        sql_query = _bind_table(template['sql_template'], self.schema_info['table_ref'])
+        if template.get('requires_amount') or template.get('requires_plan'):
+            sql_query = sql_query.format(
+                amount=entities.get('amount', 0),
+                plan=entities.get('plan', '')
+            )
         
         return sql_query, template['description'], {"confidence": confidence, "entities": entities}
     
     def execute_query(self, sql_query: str) -> Tuple[pd.DataFrame, str]:
         """Execute SQL query on BigQuery"""
         try:
-            query_job = self.client.query(sql_query)
-            df = query_job.to_dataframe()
+            rows = self.client.query_and_wait(sql_query)
+            # Arrow columns become Arrow-backed pandas columns without a NumPy copy;
+            # self_destruct frees each Arrow buffer as soon as it has been handed over
+            arrow_table = rows.to_arrow(bqstorage_client=_read_client(), create_bqstorage_client=False)
+            df = arrow_table.to_pandas(types_mapper=pd.ArrowDtype, self_destruct=True)
             return df, "success"
         except Exception as e:
             error_msg = f"Error executing query: {str(e)}"
@@ -391,6 +454,19 @@ class NLtoSQLRAG:
         return examples
 
 
+def _format_value(value) -> str:
+    """Render one result value: integers as counts, other numbers to two decimals, nulls as N/A"""
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return "N/A"
+    if isinstance(value, (bool, np.bool_)):
+        return str(value)
+    if isinstance(value, numbers.Integral):
+        return f"{value:,}"
+    if isinstance(value, (numbers.Real, Decimal)):
+        return f"{value:,.2f}"
+    return str(value)
+
+
 def format_query_results(results_df: pd.DataFrame, query_type: str = "table") -> str:
     """Format query results for display"""
     if results_df is None or results_df.empty:
@@ -398,18 +474,13 @@ def format_query_results(results_df: pd.DataFrame, query_type: str = "table") ->
     
     # For single value results
     if len(results_df) == 1 and len(results_df.columns) == 1:
-        value = results_df.iloc[0, 0]
-        return f"**Result:** {value:,.2f}" if isinstance(value, (int, float)) else f"**Result:** {value}"
+        return f"**Result:** {_format_value(results_df.iloc[0, 0])}"
     
     # For summary results (like count, sum, avg)
     if len(results_df) == 1:
         result_text = "**Results:**\n\n"
         for col in results_df.columns:
-            value = results_df[col].iloc[0]
-            if isinstance(value, (int, float)):
-                result_text += f"- **{col}:** {value:,.2f}\n"
-            else:
-                result_text += f"- **{col}:** {value}\n"
+            result_text += f"- **{col}:** {_format_value(results_df[col].iloc[0])}\n"
         return result_text
     
     # For tabular results
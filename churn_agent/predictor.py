@@ -1,7 +1,46 @@
+import os
+import copy
+import warnings
 import joblib
+from joblib import Parallel, delayed
 import pandas as pd
 import numpy as np
 import shap
+from typing import Optional
+from scipy.special import expit
+from sklearn.exceptions import InconsistentVersionWarning
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+# KernelExplainer batches at least this large are explained in parallel row chunks
+PARALLEL_EXPLAIN_MIN_ROWS = 8
+
+def _load_mapped(path: str):
+    """
+    joblib.load with read-only memory-mapped arrays, so processes serving the same
+    model share its pages. Compressed files cannot be mapped and load normally.
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='mmap_mode .* is not compatible with compressed file')
+        return joblib.load(path, mmap_mode='r')
+
+def _load_model(path: str):
+    """
+    Loads a saved model, returning (model, scikit-learn version it was pickled with
+    when that differs from the installed one, else None).
+
+    scikit-learn reports the mismatch through InconsistentVersionWarning; it is
+    collected here so callers can surface it, and other warnings are re-issued.
+    """
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', InconsistentVersionWarning)
+        model = _load_mapped(path)
+    trained_version = None
+    for w in caught:
+        if issubclass(w.category, InconsistentVersionWarning):
+            trained_version = w.message.original_sklearn_version
+        else:
+            warnings.warn_explicit(w.message, w.category, w.filename, w.lineno)
+    return model, trained_version
 
 class ChurnPredictor:
     def __init__(self, model_path: str = './model/churn_model.joblib', **kwargs):
@@ -11,7 +50,129 @@ class ChurnPredictor:
         Args:
             model_path (str): Path to the trained model file.
         """
-        self.model = joblib.load(model_path)
+        self.model, self.trained_sklearn_version = _load_model(model_path)
+        self.fused_scorer = self._build_fused_scorer(self.model)
+        self.background = self._load_background(model_path)
+        # Explainers fitted on the saved background do not depend on the input, so build them once
+        self.explainer = None
+        if self.background is not None:
+            self.explainer = self._build_explainer(self.model.named_steps['classifier'], self.background)
+
+    @staticmethod
+    def _build_fused_scorer(model):
+        """
+        Folds the fitted preprocessor into a binary linear classifier's weights.
+
+        Scaling becomes per-column weights plus an intercept shift, and each one-hot
+        encoded column becomes a category -> weight table (unknown categories score 0,
+        as with handle_unknown='ignore'). Returns (numeric columns, numeric weights,
+        [(column, categories Index, weights)], intercept), or None when the pipeline
+        has any other shape and must run through scikit-learn.
+        """
+        preprocessor = model.named_steps.get('preprocessor')
+        classifier = model.named_steps.get('classifier')
+        coef = getattr(classifier, 'coef_', None)
+        if coef is None or coef.shape[0] != 1 or not hasattr(preprocessor, 'output_indices_'):
+            return None
+
+        coef = coef[0].astype(np.float64)
+        intercept = float(classifier.intercept_[0])
+        numeric_columns, numeric_weights, category_weights = [], [], []
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == 'drop' or len(columns) == 0:
+                continue
+            weights = coef[preprocessor.output_indices_[name]]
+            if isinstance(transformer, StandardScaler):
+                mean = transformer.mean_ if transformer.with_mean else 0.0
+                scale = transformer.scale_ if transformer.with_std else 1.0
+                numeric_columns.extend(columns)
+                numeric_weights.append(weights / scale)
+                intercept -= float(np.sum(weights * mean / scale))
+            elif (isinstance(transformer, OneHotEncoder) and transformer.drop is None
+                  and transformer.handle_unknown == 'ignore'
+                  and transformer.min_frequency is None and transformer.max_categories is None):
+                start = 0
+                for column, categories in zip(columns, transformer.categories_):
+                    # Trailing 0.0 is the weight of an unseen category (get_indexer returns -1)
+                    table = np.append(weights[start:start + len(categories)], 0.0)
+                    if categories.dtype.kind in 'biuf':
+                        # Match numerically, as the encoder does (True == 1, int8 1 == int64 1)
+                        categories = categories.astype(np.float64)
+                    category_weights.append((column, pd.Index(categories), table))
+                    start += len(categories)
+            else:
+                return None
+
+        numeric_weights = np.concatenate(numeric_weights) if numeric_weights else np.zeros(0)
+        return numeric_columns, numeric_weights, category_weights, intercept
+
+    def _fused_logits(self, new_data: pd.DataFrame) -> Optional[np.ndarray]:
+        """
+        Decision values from the folded weights; no ColumnTransformer pass.
+
+        Returns None when a numeric feature is missing or infinite, so the input goes
+        through scikit-learn and is rejected there rather than scored as NaN.
+        """
+        numeric_columns, numeric_weights, category_weights, intercept = self.fused_scorer
+        numeric = new_data[numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        if not np.isfinite(numeric).all():
+            return None
+        logits = numeric @ numeric_weights + intercept
+        for column, categories, table in category_weights:
+            values = new_data[column]
+            if categories.dtype.kind == 'f':
+                values = values.to_numpy(dtype=np.float64)
+            logits += table[categories.get_indexer(values)]
+        return logits
+
+    @staticmethod
+    def _load_background(model_path: str):
+        """
+        Loads the transformed training sample saved next to the joblib model, if any.
+
+        It is ignored when older than the joblib file, since the model may have been retrained since.
+        """
+        background_path = model_path.replace('.joblib', '_background.joblib')
+        if not os.path.exists(background_path) or os.path.getmtime(background_path) < os.path.getmtime(model_path):
+            return None
+        return _load_mapped(background_path)
+
+    def _has_columns(self, new_data: pd.DataFrame) -> bool:
+        """Whether new_data has every column the fused scorer reads."""
+        numeric_columns, _, category_weights, _ = self.fused_scorer
+        required = set(numeric_columns).union(column for column, _, _ in category_weights)
+        return required.issubset(new_data.columns)
+
+    def _transform(self, new_data: pd.DataFrame) -> np.ndarray:
+        """Runs the fitted preprocessor, returning a dense C-contiguous float32 matrix."""
+        features = self.model.named_steps['preprocessor'].transform(new_data)
+        if hasattr(features, "toarray"):
+            features = features.toarray()
+        return np.ascontiguousarray(features, dtype=np.float32)
+
+    def _predict_with_probability(self, new_data: pd.DataFrame):
+        """
+        Returns (predictions, churn probabilities) as two (n,) arrays.
+
+        Binary linear models are scored from their decision values, so only the
+        positive-class column is ever computed. predict and predict_and_explain both
+        score through here, so a customer gets the same probability from either.
+        """
+        classes = self.model.classes_
+        logits = None
+        if self.fused_scorer is not None and self._has_columns(new_data):
+            logits = self._fused_logits(new_data)
+        if logits is None and len(classes) == 2 and hasattr(self.model, 'decision_function'):
+            logits = self.model.decision_function(new_data)
+        if logits is not None:
+            # Same rule as LogisticRegression.predict: positive class when the decision value is > 0
+            return classes[(logits > 0).astype(np.intp)], expit(logits)
+
+        proba = self.model.predict_proba(new_data)
+        predictions = classes[np.argmax(proba, axis=1)]
+
+        # A model trained on a single class has only one probability column
+        return predictions, proba[:, 1] if proba.shape[1] > 1 else proba[:, 0]
 
     def predict(self, new_data: pd.DataFrame) -> pd.DataFrame:
         """
@@ -23,16 +184,7 @@ class ChurnPredictor:
         Returns:
             pd.DataFrame: DataFrame with customer_id, churn_prediction, and churn_probability.
         """
-        predictions = self.model.predict(new_data)
-        proba = self.model.predict_proba(new_data)
-        
-        # Handle cases where model might only have one class
-        if proba.shape[1] == 1:
-            # Only one class predicted, use that probability
-            probabilities = proba[:, 0]
-        else:
-            # Normal case: get probability of positive class (churn)
-            probabilities = proba[:, 1]
+        predictions, probabilities = self._predict_with_probability(new_data)
 
         result_df = pd.DataFrame({
             'customer_id': new_data['customer_id'] if 'customer_id' in new_data.columns else range(len(new_data)),
@@ -41,6 +193,48 @@ class ChurnPredictor:
         })
         return result_df
 
+    @staticmethod
+    def _build_explainer(classifier, transformed_data: np.ndarray):
+        """
+        Picks a closed-form SHAP explainer for the classifier when one exists.
+
+        Linear and tree models are explained exactly from their parameters,
+        which avoids KernelExplainer's sampling over a background set.
+        """
+        if hasattr(classifier, 'coef_'):
+            return shap.LinearExplainer(classifier, transformed_data)
+        if hasattr(classifier, 'estimators_') or hasattr(classifier, 'tree_'):
+            return shap.TreeExplainer(classifier, feature_perturbation='tree_path_dependent')
+
+        # Use KernelExplainer for generic pipelines
+        if transformed_data.shape[0] > 1:
+            background_data = shap.kmeans(transformed_data, min(10, transformed_data.shape[0]))
+        else:
+            background_data = transformed_data
+        return shap.KernelExplainer(classifier.predict_proba, background_data)
+
+    @staticmethod
+    def _shap_values(explainer, transformed_data: np.ndarray):
+        """
+        explainer.shap_values, split over threads for sampling explainers.
+
+        KernelExplainer spends its time in batched predict_proba calls that release
+        the GIL; the closed-form explainers are a single matrix product and run as is.
+        """
+        n_jobs = min(os.cpu_count() or 1, transformed_data.shape[0])
+        if (not isinstance(explainer, shap.KernelExplainer)
+                or transformed_data.shape[0] < PARALLEL_EXPLAIN_MIN_ROWS or n_jobs < 2):
+            return explainer.shap_values(transformed_data)
+
+        # KernelExplainer keeps its sampling buffers on the instance, so each thread gets a shallow copy
+        chunks = np.array_split(transformed_data, n_jobs)
+        results = Parallel(n_jobs=n_jobs, backend='threading')(
+            delayed(copy.copy(explainer).shap_values)(chunk, silent=True) for chunk in chunks
+        )
+        if isinstance(results[0], list):
+            return [np.concatenate(per_class, axis=0) for per_class in zip(*results)]
+        return np.concatenate(results, axis=0)
+
     def predict_and_explain(self, new_data: pd.DataFrame):
         """
         Makes churn predictions and generates SHAP explanations.
@@ -53,16 +247,12 @@ class ChurnPredictor:
                 - pd.DataFrame: DataFrame with predictions.
                 - shap.Explanation: SHAP explanation object.
         """
-        predictions = self.model.predict(new_data)
-        proba = self.model.predict_proba(new_data)
+        preprocessor = self.model.named_steps['preprocessor']
+        classifier = self.model.named_steps['classifier']
         
-        # Handle cases where model might only have one class
-        if proba.shape[1] == 1:
-            # Only one class predicted, use that probability
-            probabilities = proba[:, 0]
-        else:
-            # Normal case: get probability of positive class (churn)
-            probabilities = proba[:, 1]
+        # Scored exactly as predict() scores; the transformed matrix is only needed for SHAP
+        predictions, probabilities = self._predict_with_probability(new_data)
+        transformed_data = self._transform(new_data)
 
         predictions_df = pd.DataFrame({
             'customer_id': new_data['customer_id'] if 'customer_id' in new_data.columns else range(len(new_data)),
@@ -70,24 +260,14 @@ class ChurnPredictor:
             'churn_probability': probabilities
         })
 
-        preprocessor = self.model.named_steps['preprocessor']
-        classifier = self.model.named_steps['classifier']
-        
-        transformed_data = preprocessor.transform(new_data)
-        if hasattr(transformed_data, "toarray"):
-            transformed_data = transformed_data.toarray()
-
         feature_names = preprocessor.get_feature_names_out()
 
-        # Use KernelExplainer for generic pipelines
-        if transformed_data.shape[0] > 1:
-            background_data = shap.kmeans(transformed_data, min(10, transformed_data.shape[0]))
-        else:
-            background_data = transformed_data
-        
-        explainer = shap.KernelExplainer(classifier.predict_proba, background_data)
+        # Without a saved background the input itself stands in for it
+        explainer = self.explainer
+        if explainer is None:
+            explainer = self._build_explainer(classifier, transformed_data)
         
-        shap_values = explainer.shap_values(transformed_data)
+        shap_values = self._shap_values(explainer, transformed_data)
 
         # Handle different SHAP value formats
         # For binary classification, shap_values can be:
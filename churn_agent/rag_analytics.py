@@ -3,11 +3,27 @@ RAG-based Analytics Question Answering System
 Uses sentence embeddings and semantic search for natural language understanding
 """
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.feature_extraction.text import TfidfVectorizer
 import pandas as pd
 from typing import List, Dict, Tuple, Optional
+from collections import OrderedDict
 import re
+import threading
+
+# Entity vocabularies; when several terms match, the later one in the tuple wins
+PLAN_TIERS = ('basic', 'standard', 'premium', 'enterprise')
+TIME_REFERENCES = ('today', 'yesterday', 'last week', 'last month', 'this month')
+
+# Compiled once so entity extraction is a handful of regex scans instead of chained substring tests
+_NUMBER_PATTERN = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLAN_PATTERN = re.compile('|'.join(PLAN_TIERS))
+_TIME_PATTERN = re.compile('|'.join(TIME_REFERENCES))
+_GREATER_PATTERN = re.compile('above|greater than|more than')
+_LESS_PATTERN = re.compile('below|less than|fewer than')
+_AUTO_RENEW_PATTERN = re.compile('auto renew|autorenew')
+
+# Number of distinct normalized questions whose intent matches are kept
+QUERY_CACHE_SIZE = 256
 
 class ChurnAnalyticsRAG:
     """
@@ -114,6 +130,11 @@ class ChurnAnalyticsRAG:
         # Build the vector index
         self._build_index()
         
+        # LRU cache of intent matches keyed on the normalized question text
+        # (the instance is shared across Streamlit sessions, hence the lock)
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        
     def _build_index(self):
         """Build TF-IDF vectors for all knowledge base entries."""
         documents = [
@@ -121,6 +142,9 @@ class ChurnAnalyticsRAG:
             for item in self.knowledge_base
         ]
         self.doc_vectors = self.vectorizer.fit_transform(documents)
+        # TF-IDF rows are already L2-normalized, so cosine similarity is a plain dot
+        # product; keep the transposed matrix ready for a single sparse mat-vec per query
+        self._doc_vectors_t = self.doc_vectors.T.tocsr()
         
     def understand_query(self, query: str, top_k: int = 3) -> List[Dict]:
         """
@@ -133,14 +157,24 @@ class ChurnAnalyticsRAG:
         Returns:
             List of matched intents with confidence scores
         """
+        # Repeated dashboard questions skip vectorization and scoring entirely
+        cache_key = (' '.join(query.lower().split()), top_k)
+        with self._query_cache_lock:
+            cached = self._query_cache.get(cache_key)
+            if cached is not None:
+                self._query_cache.move_to_end(cache_key)
+                return list(cached)
+        
         # Vectorize the query
         query_vector = self.vectorizer.transform([query.lower()])
         
         # Calculate cosine similarity
-        similarities = cosine_similarity(query_vector, self.doc_vectors)[0]
+        similarities = (query_vector @ self._doc_vectors_t).toarray().ravel()
         
-        # Get top-k matches
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        # Get top-k matches (partial selection, then order just those k)
+        k = min(top_k, len(similarities))
+        top_indices = np.argpartition(similarities, -k)[-k:]
+        top_indices = top_indices[np.argsort(similarities[top_indices], kind='stable')][::-1]
         
         matches = []
         for idx in top_indices:
@@ -152,7 +186,11 @@ class ChurnAnalyticsRAG:
                     'query_template': self.knowledge_base[idx]['query']
                 })
         
-        return matches
+        with self._query_cache_lock:
+            self._query_cache[cache_key] = matches
+            if len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return list(matches)
     
     def extract_entities(self, query: str) -> Dict:
         """
@@ -168,32 +206,30 @@ class ChurnAnalyticsRAG:
         entities = {}
         
         # Extract numbers
-        numbers = re.findall(r'\b\d+(?:\.\d+)?\b', query)
+        numbers = _NUMBER_PATTERN.findall(query)
         if numbers:
             entities['numbers'] = [float(n) for n in numbers]
         
         # Extract plan tiers
-        plans = ['basic', 'standard', 'premium', 'enterprise']
-        for plan in plans:
-            if plan in query_lower:
-                entities['plan_tier'] = plan
+        plans = set(_PLAN_PATTERN.findall(query_lower))
+        if plans:
+            entities['plan_tier'] = max(plans, key=PLAN_TIERS.index)
                 
         # Extract time references
-        time_refs = ['today', 'yesterday', 'last week', 'last month', 'this month']
-        for time_ref in time_refs:
-            if time_ref in query_lower:
-                entities['time_reference'] = time_ref
+        time_refs = set(_TIME_PATTERN.findall(query_lower))
+        if time_refs:
+            entities['time_reference'] = max(time_refs, key=TIME_REFERENCES.index)
                 
         # Extract threshold indicators
-        if 'above' in query_lower or 'greater than' in query_lower or 'more than' in query_lower:
+        if _GREATER_PATTERN.search(query_lower):
             entities['comparison'] = 'greater'
-        elif 'below' in query_lower or 'less than' in query_lower or 'fewer than' in query_lower:
+        elif _LESS_PATTERN.search(query_lower):
             entities['comparison'] = 'less'
             
         # Extract customer segments
         if 'trial' in query_lower:
             entities['is_trial'] = True
-        if 'auto renew' in query_lower or 'autorenew' in query_lower:
+        if _AUTO_RENEW_PATTERN.search(query_lower):
             entities['has_auto_renew'] = True
             
         return entities
@@ -219,13 +255,15 @@ class ChurnAnalyticsRAG:
         context_parts.append(f"Total customers analyzed: {total_customers}")
         
         if 'churn_probability' in predictions_df.columns:
-            avg_churn = predictions_df['churn_probability'].mean()
+            # Count straight off the ndarray instead of materializing filtered frames
+            probs = predictions_df['churn_probability'].to_numpy(dtype=np.float64, na_value=np.nan)
+            avg_churn = np.nanmean(probs)
             context_parts.append(f"Average churn probability: {avg_churn:.2%}")
             
-            high_risk = len(predictions_df[predictions_df['churn_probability'] > 0.75])
+            high_risk = int(np.count_nonzero(probs > 0.75))
             context_parts.append(f"High-risk customers: {high_risk}")
             
-            low_risk = len(predictions_df[predictions_df['churn_probability'] < 0.25])
+            low_risk = int(np.count_nonzero(probs < 0.25))
             context_parts.append(f"Low-risk customers: {low_risk}")
         
         return " | ".join(context_parts)
@@ -0,0 +1,129 @@
+"""
+Test the precomputed risk buckets in AnalyticsHandlers against plain pandas filtering.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+from analytics_handlers import AnalyticsHandlers, _histogram_figure
+
+def create_predictions(probabilities):
+    """Predictions frame with the given churn probabilities (None for missing)."""
+    n = len(probabilities)
+    return pd.DataFrame({
+        'customer_id': [f'C{i:05d}' for i in range(n)],
+        'churn_probability': pd.array(probabilities, dtype='Float64'),
+        'plan_tier': ['basic', 'premium'] * (n // 2) + ['basic'] * (n % 2),
+        'is_trial': [0, 1] * (n // 2) + [0] * (n % 2),
+    })
+
+def test_risk_buckets_skip_missing_probabilities():
+    """Missing probabilities fall in no risk bucket, as with pandas comparisons."""
+    df = create_predictions([0.1, 0.5, 0.9, None, 0.3, None])
+    handlers = AnalyticsHandlers(df)
+    probs = df['churn_probability']
+    low_split, high_split = handlers._risk_partition()
+    assert low_split == (probs < 0.25).sum()
+    assert high_split - low_split == ((probs >= 0.25) & (probs <= 0.75)).sum()
+    assert len(handlers._sorted_probs) - high_split == (probs > 0.75).sum() == 1
+
+def test_threshold_queries_skip_missing_probabilities():
+    """High/low threshold searches return the same rows as pandas filtering."""
+    df = create_predictions([0.1, 0.5, 0.9, None, 0.3, 0.8])
+    handlers = AnalyticsHandlers(df)
+    split = np.searchsorted(handlers._sorted_probs, 0.75, side='right')
+    expected = df.index[(df['churn_probability'] > 0.75).fillna(False)]
+    assert sorted(handlers._sorted_idx[split:]) == list(expected)
+
+def test_average_metrics_skip_missing_probabilities():
+    """Mean and median come from the finite probabilities only."""
+    df = create_predictions([0.1, 0.5, None, 0.3])
+    handlers = AnalyticsHandlers(df)
+    assert np.isclose(handlers._sorted_probs.mean(), df['churn_probability'].mean())
+    assert np.isclose(handlers._sorted_probs[len(handlers._sorted_probs) // 2], df['churn_probability'].median())
+
+def test_average_metrics_without_finite_probabilities():
+    """With every probability missing the metrics show NaN, as the pandas version did."""
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_string(f"""
+import sys
+sys.path.insert(0, {os.path.abspath(os.path.dirname(__file__))!r})
+import pandas as pd
+from analytics_handlers import AnalyticsHandlers
+df = pd.DataFrame({{'customer_id': ['a', 'b'], 'churn_probability': pd.array([None, None], dtype='Float64')}})
+AnalyticsHandlers(df).show_average_churn({{}})
+""", default_timeout=60).run()
+    assert not at.exception
+    assert [metric.value for metric in at.metric] == ['nan%'] * 3
+
+def test_bucket_edges_keep_full_precision():
+    """Probabilities just above an edge or threshold stay above it."""
+    df = create_predictions([0.75000001, 0.80000001, 0.2])
+    handlers = AnalyticsHandlers(df)
+    low_split, high_split = handlers._risk_partition()
+    assert len(handlers._sorted_probs) - high_split == 2
+    assert np.searchsorted(handlers._sorted_probs, 0.8, side='right') == 2
+
+def test_plan_stats_match_pandas_groupby():
+    """Missing probabilities are skipped per tier and only non-null customer ids are counted."""
+    df = create_predictions([0.1, None, 0.5, 0.9, None, 0.3, None])
+    df['plan_tier'] = ['basic', 'basic', 'premium', 'premium', 'standard', 'basic', 'basic']
+    df.loc[5, 'customer_id'] = None
+    expected = df.groupby('plan_tier').agg({
+        'customer_id': 'count',
+        'churn_probability': ['mean', 'min', 'max']
+    }).round(4)
+    stats = AnalyticsHandlers(df)._plan_stats()
+    assert list(stats.index) == list(expected.index)
+    np.testing.assert_allclose(stats.to_numpy(dtype=float), expected.to_numpy(dtype=float, na_value=np.nan))
+
+def test_trial_mask_treats_missing_as_not_trial():
+    """A nullable or Arrow is_trial column with missing values still yields a boolean mask."""
+    for dtype in ('Int64', 'int64[pyarrow]'):
+        df = create_predictions([0.1, 0.5, 0.9])
+        df['is_trial'] = pd.array([1, None, 0], dtype=dtype)
+        handlers = AnalyticsHandlers(df)
+        assert handlers._trial_mask.dtype == bool
+        assert list(handlers._trial_mask) == [True, False, False]
+        assert len(df.iloc[handlers._trial_mask]) == 1
+
+def test_histogram_skips_missing_probabilities():
+    """The precomputed histogram bins only the finite values, like px.histogram did."""
+    values = np.array([0.1, np.nan, 0.9, 0.5])
+    fig = _histogram_figure(values, title='Distribution', nbins=4)
+    assert sum(fig.data[0].y) == 3
+
+def test_charts_built_only_when_toggled():
+    """Handler charts stay unbuilt until their toggle is switched on."""
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_string(f"""
+import sys
+sys.path.insert(0, {os.path.abspath(os.path.dirname(__file__))!r})
+import pandas as pd
+from analytics_handlers import AnalyticsHandlers
+df = pd.DataFrame({{'customer_id': ['a', 'b', 'c'], 'churn_probability': [0.1, 0.5, 0.9],
+                    'plan_tier': ['basic', 'premium', 'basic'], 'is_trial': [0, 1, 0]}})
+AnalyticsHandlers(df).show_churn_statistics({{}})
+""", default_timeout=60).run()
+    assert not at.exception
+    assert len(at.metric) == 4
+    assert len(at.get('plotly_chart')) == 0
+    at.toggle(key='chart_churn_distribution').set_value(True).run()
+    assert len(at.get('plotly_chart')) == 1
+
+if __name__ == '__main__':
+    for test in (test_risk_buckets_skip_missing_probabilities,
+                 test_threshold_queries_skip_missing_probabilities,
+                 test_average_metrics_skip_missing_probabilities,
+                 test_average_metrics_without_finite_probabilities,
+                 test_bucket_edges_keep_full_precision,
+                 test_plan_stats_match_pandas_groupby,
+                 test_trial_mask_treats_missing_as_not_trial,
+                 test_histogram_skips_missing_probabilities,
+                 test_charts_built_only_when_toggled):
+        test()
+        print(f"✓ {test.__name__}")
+    print("✓ ALL TESTS PASSED!")
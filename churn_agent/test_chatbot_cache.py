@@ -0,0 +1,98 @@
+"""
+Test the Gemini response caches in ChurnChatbot against a stand-in Gemini client.
+"""
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+from chatbot_assistant import ChurnChatbot
+
+# Questions that embed to the same vector, as close paraphrases would
+PARAPHRASES = {"What drives churn?": 0, "what is driving churn": 0, "Explain the model": 1}
+
+class FakeGenai:
+    """Embeds known questions to one-hot vectors."""
+
+    def embed_content(self, model, content):
+        vector = np.zeros(4)
+        vector[PARAPHRASES.get(content, 3)] = 1.0
+        return {"embedding": vector}
+
+class FakeChatSession:
+    """Answers every message with a numbered reply and keeps the history like ChatSession."""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.history = []
+
+    def send_message(self, prompt, stream=False):
+        self.calls.append(prompt)
+        reply = f"answer {len(self.calls)}"
+        self.history = [*self.history, {"role": "user", "parts": [prompt]}, {"role": "model", "parts": [reply]}]
+        return [SimpleNamespace(text=reply)]
+
+def create_chatbot():
+    chatbot = ChurnChatbot(use_gemini=False)
+    calls = []
+    chatbot.use_gemini = True
+    chatbot._genai = FakeGenai()
+    chatbot.model = SimpleNamespace(start_chat=lambda history: FakeChatSession(calls))
+    chatbot.chat_session = chatbot.model.start_chat(history=[])
+    return chatbot, calls
+
+PREDICTIONS = pd.DataFrame({'churn_probability': [0.9, 0.2], 'churn_prediction': [1, 0]})
+
+def ask(chatbot, question, history=()):
+    """Ask as the app does: the history ends with the question itself."""
+    history = [*history, {"role": "user", "content": question}]
+    return chatbot.generate_response(question, PREDICTIONS, history)
+
+def test_opening_question_is_answered_from_cache():
+    chatbot, calls = create_chatbot()
+    first = ask(chatbot, "What drives churn?")
+    assert ask(chatbot, "what drives churn? ") == first
+    assert ask(chatbot, "what is driving churn") == first
+    assert len(calls) == 1
+
+def test_cache_hit_is_added_to_chat_history():
+    """A cached answer still becomes part of the conversation Gemini sees next."""
+    chatbot, calls = create_chatbot()
+    ask(chatbot, "What drives churn?")
+    chatbot.reset_conversation()
+    answer = ask(chatbot, "What drives churn?")
+    assert len(calls) == 1
+    history = chatbot.chat_session.history
+    assert [turn["role"] for turn in history] == ["user", "model"]
+    assert history[1]["parts"] == [answer]
+
+def test_follow_up_question_is_not_shared():
+    """The same follow-up in two conversations depends on each context, so both go to Gemini."""
+    chatbot, calls = create_chatbot()
+    for earlier in ("Explain the model", "What drives churn?"):
+        history = [{"role": "user", "content": earlier}, {"role": "assistant", "content": "..."}]
+        ask(chatbot, "Tell me more", history)
+    assert len(calls) == 2
+    # Follow-ups are not stored either, so an opening "Tell me more" is asked fresh
+    ask(chatbot, "Tell me more")
+    assert len(calls) == 3
+
+def test_reset_keeps_shared_answers():
+    """Clearing one conversation does not drop answers other sessions rely on."""
+    chatbot, calls = create_chatbot()
+    ask(chatbot, "What drives churn?")
+    chatbot.reset_conversation()
+    ask(chatbot, "what is driving churn")
+    assert len(calls) == 1
+
+if __name__ == '__main__':
+    for test in (test_opening_question_is_answered_from_cache,
+                 test_cache_hit_is_added_to_chat_history,
+                 test_follow_up_question_is_not_shared,
+                 test_reset_keeps_shared_answers):
+        test()
+        print(f"✓ {test.__name__}")
+    print("✓ ALL TESTS PASSED!")
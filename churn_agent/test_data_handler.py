@@ -0,0 +1,131 @@
+"""
+Test the local Parquet cache in get_churn_data against a stand-in BigQuery client.
+"""
+import sys
+import os
+import tempfile
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import pandas as pd
+import data_handler
+from data_handler import get_churn_data, store_predictions
+
+class FakeClient:
+    """Serves one in-memory table through the client calls get_churn_data makes."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.modified = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.queries = []
+        self.metadata_calls = 0
+        self.loads = []
+
+    def update(self, df: pd.DataFrame):
+        """Replace the table contents, as a write from another instance would."""
+        self.df = df
+        self.modified = self.modified.replace(hour=self.modified.hour + 1)
+
+    def get_table(self, table_ref):
+        self.metadata_calls += 1
+        schema = [SimpleNamespace(name=column) for column in self.df.columns]
+        return SimpleNamespace(schema=schema, modified=self.modified)
+
+    def dataset(self, dataset_id):
+        return SimpleNamespace(table=lambda table_id: f"{dataset_id}.{table_id}")
+
+    def load_table_from_dataframe(self, df, table_ref, job_config):
+        """Appends df in one step, advancing the table's modified time as a load job does."""
+        self.loads.append((table_ref, len(df), job_config.write_disposition))
+        self.update(pd.concat([self.df, df], ignore_index=True))
+        return SimpleNamespace(result=lambda: None)
+
+    def query_and_wait(self, query):
+        self.queries.append(query)
+        select = query.split('SELECT ', 1)[1].split(' FROM', 1)[0]
+        df = self.df if select == '*' else self.df[[c.strip('`') for c in select.split(', ')]]
+        return SimpleNamespace(to_dataframe=lambda **kwargs: df.copy())
+
+def _with_cache_dir(test):
+    """Run a test with CACHE_DIR pointed at a fresh temporary directory."""
+    def wrapper():
+        original = data_handler.CACHE_DIR
+        with tempfile.TemporaryDirectory() as tmp:
+            data_handler.CACHE_DIR = tmp
+            try:
+                test()
+            finally:
+                data_handler.CACHE_DIR = original
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+@_with_cache_dir
+def test_unchanged_table_is_served_from_cache():
+    client = FakeClient(pd.DataFrame({'customer_id': ['a'], 'churn_probability': [0.2]}))
+    first = get_churn_data('p', 'd', 't', client=client)
+    second = get_churn_data('p', 'd', 't', client=client)
+    assert len(client.queries) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+@_with_cache_dir
+def test_modified_table_is_refetched():
+    client = FakeClient(pd.DataFrame({'customer_id': ['a'], 'churn_probability': [0.2]}))
+    get_churn_data('p', 'd', 't', client=client)
+    client.update(pd.DataFrame({'customer_id': ['a', 'b'], 'churn_probability': [0.2, 0.9]}))
+    df = get_churn_data('p', 'd', 't', client=client)
+    assert len(client.queries) == 2
+    assert len(df) == 2
+
+@_with_cache_dir
+def test_column_projections_are_cached_separately():
+    client = FakeClient(pd.DataFrame({'customer_id': ['a'], 'seats': [3], 'churn_flag': [1]}))
+    projected = get_churn_data('p', 'd', 't', client=client, columns=['seats', 'churn_flag'])
+    full = get_churn_data('p', 'd', 't', client=client)
+    assert list(projected.columns) == ['seats', 'churn_flag']
+    assert list(full.columns) == ['customer_id', 'seats', 'churn_flag']
+    assert len(client.queries) == 2
+
+@_with_cache_dir
+def test_caller_table_metadata_validates_the_cache():
+    """Metadata passed in (as the training path does) is used instead of a second get_table."""
+    client = FakeClient(pd.DataFrame({'seats': [3], 'churn_flag': [1]}))
+    get_churn_data('p', 'd', 't', client=client, table=client.get_table('p.d.t'))
+    client.update(pd.DataFrame({'seats': [3, 4], 'churn_flag': [1, 0]}))
+    df = get_churn_data('p', 'd', 't', client=client, table=client.get_table('p.d.t'))
+    assert client.metadata_calls == 2
+    assert len(df) == 2
+
+@_with_cache_dir
+def test_store_is_one_append_load_job():
+    """Every row goes up in a single load job, so a failed store leaves nothing to duplicate on retry."""
+    client = FakeClient(pd.DataFrame({'customer_id': ['a'], 'churn_probability': [0.2]}))
+    new_rows = pd.DataFrame({'customer_id': [f'c{i}' for i in range(1200)], 'churn_probability': [0.5] * 1200})
+    store_predictions('p', 'd', 't', new_rows, client=client)
+    assert client.loads == [('d.t', 1200, 'WRITE_APPEND')]
+
+@_with_cache_dir
+def test_store_drops_every_cached_projection():
+    """Full and projected cache files of the stored table are removed; other tables' files stay."""
+    client = FakeClient(pd.DataFrame({'customer_id': ['a'], 'seats': [3], 'churn_flag': [1]}))
+    get_churn_data('p', 'd', 't', client=client)
+    get_churn_data('p', 'd', 't', client=client, columns=['seats', 'churn_flag'])
+    get_churn_data('p', 'd', 't2', client=client)
+    assert len(os.listdir(data_handler.CACHE_DIR)) == 3
+    store_predictions('p', 'd', 't', pd.DataFrame({'customer_id': ['b'], 'seats': [1], 'churn_flag': [0]}),
+                      client=client)
+    assert os.listdir(data_handler.CACHE_DIR) == ['d.t2.parquet']
+    projected = get_churn_data('p', 'd', 't', client=client, columns=['seats', 'churn_flag'])
+    assert len(projected) == 2
+
+if __name__ == '__main__':
+    for test in (test_unchanged_table_is_served_from_cache,
+                 test_modified_table_is_refetched,
+                 test_column_projections_are_cached_separately,
+                 test_caller_table_metadata_validates_the_cache,
+                 test_store_is_one_append_load_job,
+                 test_store_drops_every_cached_projection):
+        test()
+        print(f"✓ {test.__name__}")
+    print("✓ ALL TESTS PASSED!")
@@ -0,0 +1,55 @@
+"""
+Test how format_query_results renders single-row results from NumPy- and Arrow-backed frames.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import pyarrow as pa
+import pandas as pd
+from nl_to_sql_rag import format_query_results
+
+def as_arrow(df: pd.DataFrame) -> pd.DataFrame:
+    """The frame as execute_query returns it, with Arrow-backed columns."""
+    return pa.Table.from_pandas(df, preserve_index=False).to_pandas(types_mapper=pd.ArrowDtype)
+
+def test_count_renders_as_integer():
+    df = pd.DataFrame({'customer_count': [1234]})
+    for frame in (df, as_arrow(df)):
+        assert format_query_results(frame) == "**Result:** 1,234"
+
+def test_amount_renders_with_two_decimals():
+    df = pd.DataFrame({'total_mrr': [1234.5]})
+    for frame in (df, as_arrow(df)):
+        assert format_query_results(frame) == "**Result:** 1,234.50"
+
+def test_null_renders_as_not_available():
+    for df in (pd.DataFrame({'avg_mrr': [float('nan')]}),
+               as_arrow(pd.DataFrame({'avg_mrr': pd.array([None], dtype='Float64')})),
+               as_arrow(pd.DataFrame({'customer_count': pd.array([None], dtype='Int64')}))):
+        assert format_query_results(df) == "**Result:** N/A"
+
+def test_summary_row_formats_each_column():
+    df = pd.DataFrame({
+        'plan_tier': ['premium'],
+        'customers': [12],
+        'avg_mrr': [99.5],
+        'churned': pd.array([None], dtype='Int64'),
+    })
+    expected = ("**Results:**\n\n"
+                "- **plan_tier:** premium\n"
+                "- **customers:** 12\n"
+                "- **avg_mrr:** 99.50\n"
+                "- **churned:** N/A\n")
+    for frame in (df, as_arrow(df)):
+        assert format_query_results(frame) == expected
+
+if __name__ == '__main__':
+    for test in (test_count_renders_as_integer,
+                 test_amount_renders_with_two_decimals,
+                 test_null_renders_as_not_available,
+                 test_summary_row_formats_each_column):
+        test()
+        print(f"✓ {test.__name__}")
+    print("✓ ALL TESTS PASSED!")
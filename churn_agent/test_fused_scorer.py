@@ -0,0 +1,61 @@
+"""
+Test that ChurnPredictor's folded linear scorer agrees with the scikit-learn pipeline.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+from predictor import ChurnPredictor
+
+MODEL_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'model', 'churn_model.joblib')
+
+SAMPLE_INPUT = pd.DataFrame({
+    'customer_id': ['C001', 'C002', 'C003', 'C004'],
+    'seats': [5, 1, 20, 3],
+    'mrr_amount': [50.0, 10.0, 400.0, 75.5],
+    'arr_amount': [600.0, 120.0, 4800.0, 906.0],
+    'plan_tier': ['basic', 'premium', 'enterprise', 'standard'],  # 'enterprise' is unseen
+    'is_trial': [0, 1, 0, True],
+    'upgrade_flag': [0, 0, 1, 0],
+    'downgrade_flag': [0, 1, 0, 0],
+    'billing_frequency': ['monthly', 'annual', 'monthly', 'weekly'],
+    'auto_renew_flag': [1, 0, 1, 1]
+})
+
+def test_fused_scorer_matches_sklearn():
+    predictor = ChurnPredictor(model_path=MODEL_PATH)
+    assert predictor.fused_scorer is not None
+    result = predictor.predict(SAMPLE_INPUT)
+    expected = predictor.model.predict_proba(SAMPLE_INPUT)[:, 1]
+    np.testing.assert_allclose(result['churn_probability'], expected, rtol=0, atol=1e-12)
+    assert list(result['churn_prediction']) == list(predictor.model.predict(SAMPLE_INPUT))
+
+def test_explained_predictions_match_predict():
+    """predict and predict_and_explain give a customer the same score."""
+    predictor = ChurnPredictor(model_path=MODEL_PATH)
+    explained, _ = predictor.predict_and_explain(SAMPLE_INPUT)
+    pd.testing.assert_frame_equal(explained, predictor.predict(SAMPLE_INPUT))
+
+def test_missing_numeric_value_is_rejected_like_sklearn():
+    """A blank numeric cell raises, as scikit-learn does, instead of scoring as not churning."""
+    predictor = ChurnPredictor(model_path=MODEL_PATH)
+    for missing in (np.nan, None, np.inf):
+        data = SAMPLE_INPUT.astype({'mrr_amount': object})
+        data.loc[1, 'mrr_amount'] = missing
+        for score in (predictor.predict, predictor.model.predict_proba):
+            try:
+                score(data)
+            except ValueError:
+                continue
+            raise AssertionError(f"{score.__qualname__} accepted mrr_amount={missing!r}")
+
+if __name__ == '__main__':
+    for test in (test_fused_scorer_matches_sklearn,
+                 test_explained_predictions_match_predict,
+                 test_missing_numeric_value_is_rejected_like_sklearn):
+        test()
+        print(f"✓ {test.__name__}")
+    print("✓ ALL TESTS PASSED!")
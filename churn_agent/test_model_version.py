@@ -0,0 +1,75 @@
+"""
+Test that models pickled under another scikit-learn version still load and predict,
+with the version mismatch reported instead of blocking the app.
+"""
+import sys
+import os
+import tempfile
+import contextlib
+import io
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import pandas as pd
+import sklearn
+from predictor import ChurnPredictor
+from model_trainer import train_model
+
+APP_DIR = os.path.abspath(os.path.dirname(__file__))
+# Version the checked-in model was pickled with
+SHIPPED_MODEL_PATH = os.path.join(APP_DIR, 'model', 'churn_model.joblib')
+SHIPPED_SKLEARN_VERSION = '1.7.2'
+
+SAMPLE_INPUT = pd.DataFrame({
+    'customer_id': ['C001', 'C002'],
+    'seats': [5, 1],
+    'mrr_amount': [50, 10],
+    'arr_amount': [600, 120],
+    'plan_tier': ['basic', 'premium'],
+    'is_trial': [0, 1],
+    'upgrade_flag': [0, 0],
+    'downgrade_flag': [0, 1],
+    'billing_frequency': ['monthly', 'annual'],
+    'auto_renew_flag': [1, 0]
+})
+
+def test_shipped_model_loads_across_versions():
+    """The checked-in model loads, predicts, and reports the version it was trained with."""
+    predictor = ChurnPredictor(model_path=SHIPPED_MODEL_PATH)
+    expected = None if sklearn.__version__ == SHIPPED_SKLEARN_VERSION else SHIPPED_SKLEARN_VERSION
+    assert predictor.trained_sklearn_version == expected
+    result = predictor.predict(SAMPLE_INPUT)
+    assert result['churn_probability'].between(0, 1).all()
+
+def test_current_model_reports_no_mismatch():
+    """A model trained in this environment has no recorded mismatch."""
+    training = SAMPLE_INPUT.drop(columns=['customer_id']).iloc[[0, 1] * 10].reset_index(drop=True)
+    training['churn_flag'] = [0, 1] * 10
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, 'churn_model.joblib')
+        with contextlib.redirect_stdout(io.StringIO()):
+            train_model(training, model_path=model_path)
+        assert ChurnPredictor(model_path=model_path).trained_sklearn_version is None
+
+def test_app_loads_mismatched_model():
+    """The app keeps the predictor (and only warns) when the versions differ."""
+    from streamlit.testing.v1 import AppTest
+    cwd = os.getcwd()
+    os.chdir(APP_DIR)
+    try:
+        at = AppTest.from_file('app.py', default_timeout=120).run()
+    finally:
+        os.chdir(cwd)
+    assert not at.exception
+    assert not at.error
+    assert any('Model loaded successfully' in s.value for s in at.sidebar.success)
+    if sklearn.__version__ != SHIPPED_SKLEARN_VERSION:
+        assert any(SHIPPED_SKLEARN_VERSION in w.value for w in at.sidebar.warning)
+
+if __name__ == '__main__':
+    for test in (test_shipped_model_loads_across_versions,
+                 test_current_model_reports_no_mismatch,
+                 test_app_loads_mismatched_model):
+        test()
+        print(f"✓ {test.__name__}")
+    print("✓ ALL TESTS PASSED!")
@@ -0,0 +1,59 @@
+"""
+Test how NLtoSQLRAG.find_best_template picks a SQL template, without a BigQuery connection.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from nl_to_sql_rag import NLtoSQLRAG, QUERY_TEMPLATES, _template_index
+
+# Question -> description of the template it should use
+MATCHING_TABLE = [
+    ("How many customers do we have?", "Count total customers"),
+    ("What is the total revenue?", "Calculate total MRR"),
+    ("What is the churn rate?", "Calculate churn rate"),
+    ("Show me customers spending more than $500", "Get customers with MRR above threshold"),
+    ("Get customers in premium plan", "Get customers by plan type"),
+    # Several templates quoted literally: the closest one wins
+    ("total revenue from churned customers", "Calculate total MRR"),
+    ("average mrr of churned customers", "Calculate average MRR"),
+    ("list active customers with tenure", "Get longest tenure customers"),
+]
+
+def create_rag():
+    """NLtoSQLRAG with only the template index set up (no BigQuery client or schema)."""
+    rag = NLtoSQLRAG.__new__(NLtoSQLRAG)
+    rag.query_templates = QUERY_TEMPLATES
+    rag.vectorizer, rag.pattern_vectors, rag.pattern_to_template = _template_index()
+    return rag
+
+def test_template_matching_table():
+    rag = create_rag()
+    mismatched = []
+    for question, expected in MATCHING_TABLE:
+        template, _ = rag.find_best_template(question)
+        if template is None or template['description'] != expected:
+            mismatched.append((question, expected, template and template['description']))
+    assert not mismatched, mismatched
+
+def test_literal_match_reports_similarity_score():
+    """A literal phrase match reports its TF-IDF similarity, not a fixed 1.0."""
+    rag = create_rag()
+    _, confidence = rag.find_best_template("total revenue from churned customers")
+    assert 0.1 < confidence < 1.0
+    _, exact = rag.find_best_template("total revenue")
+    assert exact > confidence
+
+def test_unrelated_question_has_no_template():
+    template, confidence = create_rag().find_best_template("zzz qqq")
+    assert template is None
+    assert confidence == 0.0
+
+if __name__ == '__main__':
+    for test in (test_template_matching_table,
+                 test_literal_match_reports_similarity_score,
+                 test_unrelated_question_has_no_template):
+        test()
+        print(f"✓ {test.__name__}")
+    print("✓ ALL TESTS PASSED!")
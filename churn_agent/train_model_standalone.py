@@ -8,7 +8,7 @@ import sys
 sys.path.insert(0, os.path.dirname(__file__))
 
 from data_handler import get_churn_data
-from model_trainer import train_model
+from model_trainer import train_model, TRAINING_COLUMNS
 
 # Configuration
 PROJECT_ID = "hackathon-475722"
@@ -27,7 +27,7 @@ def main():
     print(f"   Table: {TABLE_ID}")
     
     try:
-        training_data = get_churn_data(PROJECT_ID, DATASET_ID, TABLE_ID)
+        training_data = get_churn_data(PROJECT_ID, DATASET_ID, TABLE_ID, columns=TRAINING_COLUMNS)
         print(f"   ✓ Fetched {len(training_data)} rows")
         print(f"   ✓ Columns: {list(training_data.columns)}")
     except Exception as e: